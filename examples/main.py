@@ -42,4 +42,5 @@ def redirect_test(request: Request):
 
 
 # Running the server (Waitress)
-app.run(port=80)
+if __name__ == "__main__":
+    app.run(port=80)
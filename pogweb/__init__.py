@@ -11,7 +11,9 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 
 from pogweb.application import WebApp
 from pogweb.extension import Extension
-from pogweb.models import Request, ImmutableDict
+from pogweb.models import Request, Response, ImmutableDict
+from pogweb.caching import cached, CachePolicy
+from pogweb.streaming import StreamingResponse, EventStream, Broadcast
 
 __author__ = "K.M Ahnaf Zamil"
 __version__ = "0.0.1-alpha"
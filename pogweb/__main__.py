@@ -0,0 +1,67 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import traceback
+import typing
+
+
+def load_app(target: str):
+    """Imports an app from a "module:attribute" string, e.g. "main:app\" """
+    module_name, _, attribute = target.partition(":")
+    sys.path.insert(0, os.getcwd())
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or "app")
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pogweb", description="Runs or checks a PogWeb app"
+    )
+    parser.add_argument("app", help='the app to load, e.g. "main:app"')
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="run the startup phase and print its summary without serving",
+    )
+    parser.add_argument(
+        "--fingerprint", action="store_true", help="fingerprint static file URLs"
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--asgi", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        app = load_app(args.app)
+        summary = app.startup(fingerprint=args.fingerprint)
+    except Exception:
+        traceback.print_exc()
+        print("Startup check failed", file=sys.stderr)
+        return 1
+    if args.check:
+        print(json.dumps(summary, indent=2))
+        print(
+            f"OK: {len(summary['routes'])} routes, {summary['templates']} templates"
+            f" and {len(summary['assets'])} static files",
+            file=sys.stderr,
+        )
+        return 0
+    app.run(port=args.port, asgi=args.asgi, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from datetime import datetime, timezone
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import typing
+
+__all__: typing.Final = ["AccessLogger", "FORMATS"]
+
+# Templates use the fields of `AccessLogger._fields`
+FORMATS: typing.Final = {
+    "common": "pogweb>> {remote} - {method}: {protocol} '{path}{query}' [{status}]",
+    "combined": '{remote} - - [{time}] "{method} {path}{query} {protocol}" '
+    "{status} {size} {duration_ms}ms",
+}
+
+
+class AccessLogger(object):
+    """Writes access log lines from a background thread, in batches
+
+    The request thread only checks whether the `pogweb.access` logger is
+    enabled for INFO and puts a tuple of raw values on a bounded queue, all
+    formatting and I/O happens on the writer thread. When the queue is full
+    records are dropped (the newest by default, or the oldest with
+    `drop="oldest"`) and the number of dropped records is logged.
+
+    Lines are written to `stream` (stderr by default). If `stream` isn't
+    given and handlers were added to the `pogweb.access` logger, each line
+    is passed to them instead, like a `logging.handlers.QueueListener`.
+
+    `format` is "common", "combined", "json" (JSON lines) or a custom
+    `str.format` template.
+    """
+
+    def __init__(
+        self,
+        *,
+        format: str = "common",
+        stream: typing.Optional[typing.TextIO] = None,
+        max_queue: int = 10000,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        drop: str = "newest",
+    ) -> None:
+        if drop not in ("newest", "oldest"):
+            raise ValueError("drop must be 'newest' or 'oldest'")
+        self.logger = logging.getLogger("pogweb.access")
+        self._template = None if format == "json" else FORMATS.get(format, format)
+        self._stream = stream
+        self._max_queue = max_queue
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._drop_oldest = drop == "oldest"
+        self._queue: "queue.Queue[typing.Optional[tuple]]" = queue.Queue(max_queue)
+        self._thread: typing.Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        atexit.register(self.stop)
+
+    def log(self, environ, status: int, headers: typing.Optional[list] = None) -> None:
+        """Queues an access log record for a finished request"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if self._pid != os.getpid():
+            self._start()
+        size = None
+        for name, value in headers or ():
+            if name.lower() == "content-length":
+                size = int(value)
+                break
+        start = environ.get("pogweb.start_time")
+        record = (
+            time.time(),
+            environ.get("REMOTE_ADDR", "-"),
+            environ.get("REQUEST_METHOD", ""),
+            environ.get("PATH_INFO", ""),
+            environ.get("QUERY_STRING", ""),
+            environ.get("SERVER_PROTOCOL", ""),
+            status,
+            size,
+            time.perf_counter() - start if start is not None else None,
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self._drop_oldest:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Threads don't survive fork(), so every worker process starts its
+            # own writer (with a fresh queue)
+            self._queue = queue.Queue(self._max_queue)
+            self._thread = threading.Thread(
+                target=self._run, name="pogweb-access-log", daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Flushes queued records and stops the writer thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._pid = None
+
+    def _fields(self, record: tuple) -> dict:
+        timestamp, remote, method, path, query, protocol, status, size, duration = (
+            record
+        )
+        return {
+            "time": datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            "remote": remote,
+            "method": method,
+            "path": path,
+            "query": "?" + query if query else "",
+            "protocol": protocol,
+            "status": status,
+            "size": "-" if size is None else size,
+            "duration_ms": "-" if duration is None else round(duration * 1000, 3),
+        }
+
+    def format(self, record: tuple) -> str:
+        fields = self._fields(record)
+        if self._template is None:
+            fields["query"] = fields["query"][1:]
+            for key in ("size", "duration_ms"):
+                if fields[key] == "-":
+                    fields[key] = None
+            return json.dumps(fields, separators=(",", ":"))
+        return self._template.format(**fields)
+
+    def _write(self, records: typing.List[tuple]) -> None:
+        lines = [self.format(record) for record in records]
+        dropped, self.dropped = self.dropped, 0
+        if self._stream is None and self.logger.handlers:
+            self._emit(lines, dropped)
+            return
+        if dropped:
+            lines.append(f"pogweb.access>> {dropped} access log records dropped")
+        stream = self._stream or sys.stderr
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    def _emit(self, lines: typing.List[str], dropped: int) -> None:
+        """Passes lines to the logger's handlers, the level was checked in `log`"""
+        logger = self.logger
+        for line in lines:
+            logger.handle(
+                logger.makeRecord(logger.name, logging.INFO, "", 0, line, (), None)
+            )
+        if dropped:
+            logger.handle(
+                logger.makeRecord(
+                    logger.name,
+                    logging.WARNING,
+                    "",
+                    0,
+                    "%d access log records dropped",
+                    (dropped,),
+                    None,
+                )
+            )
+
+    def _run(self) -> None:
+        get = self._queue.get
+        while True:
+            record = get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self._flush_interval
+            stop = False
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stop:
+                return
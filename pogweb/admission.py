@@ -0,0 +1,236 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from collections import OrderedDict
+
+import math
+import threading
+import time
+import typing
+
+__all__: typing.Final = ["RateLimit", "TokenBuckets", "AdmissionControl", "PRIORITIES"]
+
+# Share of `max_in_flight` each priority class may fill. Low priority
+# (e.g. expensive rendering) endpoints are shed first, leaving room for the
+# rest, and critical ones (e.g. health checks) may use every slot
+PRIORITIES: typing.Final = {"critical": 1.0, "normal": 0.85, "low": 0.6}
+
+
+class RateLimit(object):
+    """`rate` requests per second on average, with bursts of up to `burst`"""
+
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: typing.Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1)
+
+
+class TokenBuckets(object):
+    """Token buckets for any number of keys, holding at most `max_keys` of them
+
+    A bucket that went unused for long enough to refill completely is the
+    same as a new one, so such idle buckets are dropped as they are found.
+    When there are still too many, the least recently used one is dropped.
+    """
+
+    def __init__(self, limit: RateLimit, *, max_keys: int = 10000) -> None:
+        self.limit = limit
+        self._max_keys = max_keys
+        self._idle_after = limit.burst / limit.rate
+        # key -> [tokens, last update], least recently used first
+        self._buckets: "OrderedDict[typing.Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: typing.Hashable, now: typing.Optional[float] = None) -> float:
+        """Takes a token for `key`, returns 0 or the seconds until there is one"""
+        if now is None:
+            now = time.monotonic()
+        rate, burst = self.limit.rate, self.limit.burst
+        with self._lock:
+            buckets = self._buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [burst, now]
+                self._evict(now)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        cutoff = now - self._idle_after
+        while buckets:
+            key, (_, last) = next(iter(buckets.items()))
+            if last > cutoff and len(buckets) <= self._max_keys:
+                break
+            del buckets[key]
+
+
+class AdmissionControl(object):
+    """Decides whether a request is served or shed before its handler runs
+
+    Requests over a rate limit get 429 Too Many Requests. Once the app is
+    handling `max_in_flight` requests (scaled by the endpoint's priority
+    class, see `PRIORITIES`), new ones get 503 Service Unavailable right
+    away instead of queueing up. Both come with a Retry-After header.
+
+    `client_limit` applies to every client, identified by `client_key(environ)`
+    (the remote address by default). Per-endpoint limits are set with
+    `rate_limit=` on `endpoint()`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: typing.Optional[int] = None,
+        client_limit: typing.Optional[RateLimit] = None,
+        max_clients: int = 10000,
+        client_key: typing.Optional[typing.Callable[[dict], str]] = None,
+        retry_after: int = 1,
+        priorities: typing.Optional[typing.Dict[str, float]] = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self._client_buckets = (
+            TokenBuckets(client_limit, max_keys=max_clients) if client_limit else None
+        )
+        self._client_key = client_key or _remote_addr
+        self._endpoint_buckets: typing.Dict[str, TokenBuckets] = {}
+        self._caps = {}
+        self.priorities = {**PRIORITIES, **(priorities or {})}
+        for name, share in self.priorities.items():
+            self._caps[name] = (
+                max(1, int(max_in_flight * share)) if max_in_flight else None
+            )
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def server_threads(self, default: int = 4) -> int:
+        """How many threads a threaded server needs for the cap to shed load
+
+        Waitress queues requests once all of its threads are busy, so they'd
+        never reach the cap. With spare threads over `max_in_flight`, excess
+        requests reach the app and are answered with a quick 503 instead.
+        """
+        if not self.max_in_flight:
+            return default
+        return self.max_in_flight + max(4, self.max_in_flight // 4)
+
+    def admit(self, environ, endpoint) -> typing.Optional[typing.Tuple[int, int]]:
+        """Returns None if the request may go ahead, or the status and Retry-After
+
+        Every admitted request must be followed by a call to `release()`.
+        """
+        now = time.monotonic()
+        if self._client_buckets is not None:
+            wait = self._client_buckets.take(self._client_key(environ), now)
+            if wait:
+                return self._reject(429, wait)
+        limit = endpoint.rate_limit
+        if limit is not None:
+            buckets = self._endpoint_buckets.get(endpoint.route)
+            if buckets is None:
+                buckets = self._endpoint_buckets.setdefault(
+                    endpoint.route, TokenBuckets(limit, max_keys=1)
+                )
+            wait = buckets.take(None, now)
+            if wait:
+                return self._reject(429, wait)
+        cap = self._caps.get(endpoint.priority)
+        with self._lock:
+            if cap is not None and self.in_flight >= cap:
+                self.shed += 1
+                return 503, self.retry_after
+            self.in_flight += 1
+        return None
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def hold(self, body):
+        """Wraps a streaming body so its request is released once it's closed
+
+        A stream (e.g. an `EventStream`) counts against `max_in_flight` for as
+        long as it's being sent, not just while its handler runs. The server
+        must close the returned body, as WSGI and ASGI servers do.
+        """
+        if hasattr(body, "__aiter__"):
+            return _HeldAsyncBody(body, self.release)
+        return _HeldBody(body, self.release)
+
+    def _reject(self, status: int, wait: float) -> typing.Tuple[int, int]:
+        with self._lock:
+            self.shed += 1
+        return status, max(1, math.ceil(wait))
+
+
+class _HeldBody(object):
+    __slots__ = ("_body", "_release")
+
+    def __init__(self, body: typing.Iterable[bytes], release: typing.Callable) -> None:
+        self._body = body
+        self._release = release
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        return iter(self._body)
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            release()
+
+
+class _HeldAsyncBody(object):
+    __slots__ = ("_iterator", "_release")
+
+    def __init__(
+        self, body: typing.AsyncIterable[bytes], release: typing.Callable
+    ) -> None:
+        self._iterator = body.__aiter__()
+        self._release = release
+
+    def __aiter__(self) -> "_HeldAsyncBody":
+        return self
+
+    async def __anext__(self) -> bytes:
+        return await self._iterator.__anext__()
+
+    async def aclose(self) -> None:
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            if hasattr(self._iterator, "aclose"):
+                await self._iterator.aclose()
+        finally:
+            release()
+
+
+def _remote_addr(environ) -> str:
+    return environ.get("REMOTE_ADDR", "")
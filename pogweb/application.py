@@ -10,138 +10,536 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 """
 
 from waitress import serve
-from pogweb import utils
-from pogweb.models import Request, _Redirect, Endpoint
+from pogweb import utils, server
+from pogweb.asgi import ASGIApp
+from pogweb.workers import Arbiter
+from pogweb.models import Request, Response, _Redirect, Endpoint
 from pogweb.renderer import Renderer
-from pogweb.errors import EndpointError
+from pogweb.routing import Router
+from pogweb.errors import BadRequestError, EndpointError, RequestEntityTooLarge
+from pogweb.static import StaticFiles
+from pogweb.access_log import AccessLogger
+from pogweb.metrics import Metrics, DEFAULT_BUCKETS, CONTENT_TYPE
+from pogweb.encoding import get_json_encoder, iter_json_array
+from pogweb.compression import Compressor
+from pogweb.caching import CacheBackend, CachedResponse, CachePolicy, ResponseCache
+from pogweb.streaming import iterate_sync
+from pogweb.admission import AdmissionControl, RateLimit, PRIORITIES
 
-import json
+import asyncio
+import dataclasses
+import inspect
+import types
 import typing
 import logging
 import socket
+import time
 import traceback
 
 __all__: typing.Final = ["WebApp"]
 
+# Header sets shared by every response, copied instead of rebuilt
+_HTML_HEADERS: typing.Final = (("Content-Type", "text/html"),)
+_JSON_HEADERS: typing.Final = (("Content-Type", "application/json"),)
+_CORS_CREDENTIALS: typing.Final = ("Access-Control-Allow-Credentials", "true")
+_VARY_ORIGIN: typing.Final = ("Vary", "Origin")
+_ALL_METHODS: typing.Final = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE")
+
 
 class BaseApp(object):
     """Base class for all app/extension-like objects"""
 
-    def __init__(self, cors=False, debug=False) -> None:
+    def __init__(
+        self,
+        cors=False,
+        debug=False,
+        max_body_size=16 * 1024 * 1024,
+        json_encoder=None,
+        compression=True,
+        access_log=True,
+    ) -> None:
         self.routes = {}
-        self.cors = cors
+        if access_log is True:
+            access_log = AccessLogger()
+        self.access_log = access_log or None
+        self._json = get_json_encoder(json_encoder)
+        if compression is True:
+            compression = Compressor()
+        self._compressor = compression or None
+        self.max_body_size = max_body_size
+        self._router = Router()
+        # True allows every origin, or pass a collection of allowed origins
+        self.cors = cors if isinstance(cors, bool) else frozenset(cors)
+        self.cors_allow_headers = ("Content-Type", "Authorization")
+        self._preflights = {}
         self._debug = debug
         self._logger = logging.getLogger("pogweb")
         self._not_found = utils.handle_not_found
         self._renderer = Renderer("./html/")
+        self._static = StaticFiles(".", compressor=self._compressor)
+        self.response_cache = ResponseCache()
+        self.manifest = None
+        self.admission = None
+        # Set by `WebApp.enable_metrics`, nothing is measured without it
+        self.metrics = None
+        self._before_hooks = []
+        self._after_hooks = []
+        # The app an extension was loaded into, its hooks are compiled there
+        self._owner = None
 
-    def endpoint(self, route: str):
-        """Add an endpoint handler to the application (Non-decorator styled)"""
+    def endpoint(
+        self,
+        route: str,
+        *,
+        methods: typing.Optional[typing.Iterable[str]] = None,
+        cache: typing.Optional[CachePolicy] = None,
+        rate_limit: typing.Optional[RateLimit] = None,
+        priority: typing.Optional[str] = None,
+    ):
+        """Add an endpoint handler to the application (Decorator styled)"""
 
         def decorator(func: typing.Callable):
-            if route in self.routes:
-                raise EndpointError(f"The endpoint {route} already exists")
-            endpoint = Endpoint(route, func)
-            self.routes[route] = endpoint
-            return endpoint
+            return self.add_endpoint(
+                route,
+                func,
+                methods=methods,
+                cache=cache,
+                rate_limit=rate_limit,
+                priority=priority,
+            )
 
         return decorator
 
-    def add_endpoint(self, route: str, func: typing.Callable) -> None:
-        """Add an endpoint handler to the application (Non-decorator styled)"""
-        if route in self.routes:
-            raise EndpointError(f"The endpoint {route} already exists")
-        endpoint = Endpoint(route, func)
-        self.routes[route] = endpoint
+    def add_endpoint(
+        self,
+        route: str,
+        func: typing.Callable,
+        *,
+        methods: typing.Optional[typing.Iterable[str]] = None,
+        cache: typing.Optional[CachePolicy] = None,
+        rate_limit: typing.Optional[RateLimit] = None,
+        priority: typing.Optional[str] = None,
+    ) -> Endpoint:
+        """Add an endpoint handler to the application (Non-decorator styled)
+
+        `rate_limit` and `priority` ("critical", "normal" or "low") apply to
+        the whole route once admission control is set up.
+        """
+        if cache is not None:
+            func.cache_policy = cache
+        endpoint = Endpoint(route, func, methods)
+        if rate_limit is not None:
+            endpoint.rate_limit = rate_limit
+        if priority is not None:
+            self._check_priority(route, priority)
+            endpoint.priority = priority
+        existing = self.routes.get(route)
+        endpoint = self._add_route(endpoint)
+        if existing is not None:
+            # Later handlers of a route can set its limits too
+            endpoint.rate_limit = rate_limit or endpoint.rate_limit
+            endpoint.priority = priority or endpoint.priority
         return endpoint
 
-    def handle_request(self, environ, start_fn, endpoint) -> typing.List[str]:
+    def before_request(self, func: typing.Callable) -> typing.Callable:
+        """Runs `func(request)` before every endpoint handler (Decorator styled)
+
+        If it returns anything but None, that is sent as the response and
+        the handler is skipped. Hooks added to an extension only run for the
+        extension's routes, and run after the app's own hooks.
+        """
+        self._before_hooks.append(func)
+        (self._owner or self)._compile_hooks()
+        return func
+
+    def after_request(self, func: typing.Callable) -> typing.Callable:
+        """Runs `func(request, response)` after every endpoint (Decorator styled)
+
+        `response` is a (status, headers, body) tuple, the hook may return a
+        new one to replace it. CORS headers and compression are applied after
+        the hooks ran. After hooks run in reverse order of adding.
+        """
+        self._after_hooks.append(func)
+        (self._owner or self)._compile_hooks()
+        return func
+
+    def _compile_hooks(self, endpoints=None) -> None:
+        """Flattens app and extension hooks into each endpoint's hook chain"""
+        for endpoint in self.routes.values() if endpoints is None else endpoints:
+            before = list(self._before_hooks)
+            after = list(self._after_hooks)
+            ext = endpoint.extension
+            if ext is not None and ext is not self:
+                before += ext._before_hooks
+                after += ext._after_hooks
+            if before or after:
+                endpoint.hooks = (tuple(before), tuple(reversed(after)))
+            else:
+                endpoint.hooks = None
+
+    def set_admission_control(self, admission: AdmissionControl) -> None:
+        """Rate limits requests and sheds load, see `pogweb.admission`"""
+        self.admission = admission
+        for endpoint in self.routes.values():
+            self._check_priority(endpoint.route, endpoint.priority)
+
+    def _check_priority(self, route: str, priority: str) -> None:
+        """Raises EndpointError for priority classes admission control lacks"""
+        classes = self.admission.priorities if self.admission else PRIORITIES
+        if priority not in classes:
+            raise EndpointError(
+                f"Unknown priority {priority!r} for {route}, "
+                f"expected one of {', '.join(classes)}"
+            )
+
+    def set_cache_backend(self, backend: CacheBackend) -> None:
+        """Changes where cached endpoint responses are stored"""
+        self.response_cache = ResponseCache(backend)
+
+    def _add_route(self, endpoint: Endpoint) -> Endpoint:
+        """Registers an endpoint, merging per-method handlers of the same route"""
+        existing = self.routes.get(endpoint.route)
+        if existing is not None:
+            existing.merge(endpoint)
+            self._preflights.pop(endpoint.route, None)
+            return existing
+        self._preflights.clear()
+        self._router.add(endpoint.route, endpoint)
+        self.routes[endpoint.route] = endpoint
+        self._compile_hooks([endpoint])
+        return endpoint
+
+    def handle_request(
+        self, environ, start_fn, endpoint, path_params: typing.Optional[dict] = None
+    ) -> typing.List[bytes]:
         """Handles all HTML/JSON HTTP requests"""
         if not endpoint == utils.handle_not_found:
-            request = Request(environ)
-            data = endpoint(request)
-            if isinstance(data, _Redirect):
-                if not data.url.lower().startswith("http"):
-                    url = f"{environ.get('wsgi.url_scheme', 'http')}://"
-                    if environ.get("HTTP_HOST"):
-                        url += environ["HTTP_HOST"]
-                    else:
-                        url += environ["SERVER_NAME"]
-                    url += data.url
-                else:
-                    url = data.url
-                headers = [("Location", url), ("Content-Length", "0")]
-                start_fn("301 Moved Permanently", headers)
-                utils.log_request(self._logger, environ, 301)
-                return [""]
-            if isinstance(data, dict):
-                headers = self._handle_cors(
-                    environ, [("Content-Type", "application/json")]
+            if self._is_preflight(environ):
+                return self.handle_preflight(environ, start_fn, endpoint)
+            handler = endpoint.handler_for(environ["REQUEST_METHOD"])
+            if handler is None:
+                self._log_request(environ, 405)
+                return utils.handle_method_not_allowed(
+                    environ, start_fn, endpoint.allowed_methods
                 )
-                start_fn("200 OK", headers)
-                data = json.dumps(data)
-            else:
-                headers = self._handle_cors(environ, [("Content-Type", "text/html")])
-                start_fn("200 OK", headers)
-            utils.log_request(self._logger, environ, 200)
-            return [data]
+            admission = self.admission
+            if admission is not None:
+                rejected = admission.admit(environ, endpoint)
+                if rejected is not None:
+                    return self._reject(environ, start_fn, *rejected)
+            request = Request(environ, path_params, self.max_body_size)
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.enter(endpoint.route)
+            held = False
+            try:
+                if (request.content_length or 0) > self.max_body_size:
+                    raise RequestEntityTooLarge()
+                if endpoint.hooks is None:
+                    status, headers, body = self._respond(environ, handler, request)
+                else:
+                    status, headers, body = self._respond_with_hooks(
+                        environ, endpoint.hooks, handler, request
+                    )
+                if hasattr(body, "__aiter__"):
+                    # Async streaming bodies, e.g. an `EventStream`
+                    body = iterate_sync(body)
+                if admission is not None and not isinstance(body, list):
+                    # Streams are released when the server closes them
+                    body = admission.hold(body)
+                    held = True
+            except RequestEntityTooLarge:
+                self._log_request(environ, 413)
+                return utils.handle_request_too_large(environ, start_fn)
+            except BadRequestError:
+                self._log_request(environ, 400)
+                return utils.handle_bad_request(environ, start_fn)
+            finally:
+                if metrics is not None:
+                    metrics.exit(endpoint.route)
+                if admission is not None and not held:
+                    admission.release()
+            start_fn(status, headers)
+            self._log_request(environ, int(status[:3]), headers)
+            return body
         else:
-            utils.log_request(self._logger, environ, 404)
+            self._log_request(environ, 404)
             return self._not_found(environ, start_fn)
 
-    def handle_css_or_js(self, environ, start_fn) -> typing.List[str]:
+    def _reject(
+        self, environ, start_fn, status: int, retry_after: int
+    ) -> typing.List[bytes]:
+        self._log_request(environ, status)
+        if status == 429:
+            return utils.handle_too_many_requests(environ, start_fn, retry_after)
+        return utils.handle_service_unavailable(environ, start_fn, retry_after)
+
+    def _is_preflight(self, environ) -> bool:
+        return bool(
+            self.cors
+            and environ["REQUEST_METHOD"] == "OPTIONS"
+            and "HTTP_ACCESS_CONTROL_REQUEST_METHOD" in environ
+        )
+
+    def handle_preflight(self, environ, start_fn, endpoint) -> typing.List[bytes]:
+        """Answers CORS preflight requests, the headers are built once per route"""
+        headers = self._preflights.get(endpoint.route)
+        if headers is None:
+            headers = self._preflights[endpoint.route] = (
+                (
+                    "Access-Control-Allow-Methods",
+                    ", ".join(endpoint.allowed_methods or _ALL_METHODS),
+                ),
+                ("Access-Control-Allow-Headers", ", ".join(self.cors_allow_headers)),
+                ("Access-Control-Max-Age", "600"),
+            )
+        start_fn("204 No Content", self._handle_cors(environ, list(headers)))
+        self._log_request(environ, 204)
+        return []
+
+    def _log_request(
+        self, environ, status: int, headers: typing.Optional[list] = None
+    ) -> None:
+        if self.access_log is not None:
+            self.access_log.log(environ, status, headers)
+        if self.metrics is not None:
+            self.metrics.count_request(
+                environ.get("pogweb.route", ""),
+                environ["REQUEST_METHOD"],
+                status,
+                time.perf_counter() - environ["pogweb.start_time"],
+            )
+
+    def _call_handler(self, handler: typing.Callable, request: Request):
+        if self.metrics is not None:
+            start = time.perf_counter()
+        data = handler(request)
+        if inspect.iscoroutine(data):
+            # `async def` endpoints still work under a WSGI server
+            data = asyncio.run(data)
+        if self.metrics is not None:
+            self.metrics.observe(
+                "handler",
+                request.environ.get("pogweb.route", ""),
+                time.perf_counter() - start,
+            )
+        return data
+
+    def _respond(
+        self, environ, handler: typing.Callable, request: Request
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Runs a handler, going through the response cache if it's cached"""
+        return self._finalize(environ, *self._encoded(environ, handler, request))
+
+    def _encoded(self, environ, handler: typing.Callable, request: Request) -> tuple:
+        """Same as `_respond` without CORS and compression
+
+        Returns the status, headers, body and the compressed bodies memoised
+        for the response (None unless it came from the response cache).
+        """
+        policy = getattr(handler, "cache_policy", None)
+        if policy is None or not policy.applies_to(request):
+            data = self._call_handler(handler, request)
+            return (*self.encode_response(environ, data), None)
+
+        def compute():
+            data = self._call_handler(handler, request)
+            return CachedResponse.wrap(*self.encode_response(environ, data))
+
+        value = self.response_cache.get_or_set(
+            policy.key_for(request), policy.ttl, compute
+        )
+        return self._from_cache(value)
+
+    def _respond_with_hooks(
+        self, environ, hooks: tuple, handler: typing.Callable, request: Request
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Runs the hooks around a handler, on the response before compression"""
+        before, after = hooks
+        for hook in before:
+            data = self._call_hook(hook, request)
+            if data is not None:
+                status, headers, body = self.encode_response(environ, data)
+                memo = None
+                break
+        else:
+            status, headers, body, memo = self._encoded(environ, handler, request)
+        if after:
+            response = status, headers, body
+            chunk = body[0] if memo is not None else None
+            for hook in after:
+                response = self._call_hook(hook, request, response) or response
+            if memo is not None and not self._same_body(body, response[2], chunk):
+                memo = None  # The memoised compressed bodies no longer match
+            status, headers, body = response
+        return self._finalize(environ, status, headers, body, memo)
+
+    @staticmethod
+    def _same_body(body: list, new_body, chunk: bytes) -> bool:
+        """Whether after hooks left the body of a cached response untouched"""
+        return new_body is body and len(body) == 1 and body[0] is chunk
+
+    def _call_hook(self, hook: typing.Callable, *args):
+        data = hook(*args)
+        if inspect.iscoroutine(data):
+            data = asyncio.run(data)
+        return data
+
+    @staticmethod
+    def _from_cache(value) -> tuple:
+        """Unpacks a response cache value like `_encoded` returns it"""
+        if isinstance(value, CachedResponse):
+            return value.status, list(value.headers), [value.body], value.variants
+        return (*value, None)
+
+    def _finalize(
+        self,
+        environ,
+        status: str,
+        headers: list,
+        body: typing.Iterable[bytes],
+        memo: typing.Optional[dict] = None,
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        headers, body = self.finalize_response(environ, status, headers, body, memo)
+        return status, headers, body
+
+    def make_response(
+        self, environ, data
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Turns whatever an endpoint returned into a status, headers and body
+
+        Dicts, lists and dataclasses are encoded as JSON, generators are
+        streamed as a JSON array, `Response` objects are sent as they are and
+        anything else is sent as HTML.
+        """
+        status, headers, body = self.encode_response(environ, data)
+        headers, body = self.finalize_response(environ, status, headers, body)
+        return status, headers, body
+
+    def encode_response(
+        self, environ, data
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Encodes an endpoint's return value, without CORS or compression"""
+        if self.metrics is None:
+            return self._encode_response(environ, data)
+        start = time.perf_counter()
+        response = self._encode_response(environ, data)
+        self.metrics.observe(
+            "serialize", environ.get("pogweb.route", ""), time.perf_counter() - start
+        )
+        return response
+
+    def _encode_response(
+        self, environ, data
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        if isinstance(data, _Redirect):
+            if not data.url.lower().startswith("http"):
+                url = f"{environ.get('wsgi.url_scheme', 'http')}://"
+                if environ.get("HTTP_HOST"):
+                    url += environ["HTTP_HOST"]
+                else:
+                    url += environ["SERVER_NAME"]
+                url += data.url
+            else:
+                url = data.url
+            headers = [("Location", url), ("Content-Length", "0")]
+            return "301 Moved Permanently", headers, [b""]
+        if isinstance(data, Response):
+            return data.to_wsgi()
+        if isinstance(data, (dict, list)) or (
+            dataclasses.is_dataclass(data) and not isinstance(data, type)
+        ):
+            headers = list(_JSON_HEADERS)
+            data = self._json.dumps(data)
+        elif isinstance(data, types.GeneratorType):
+            # Generators are streamed as a JSON array, item by item
+            return "200 OK", list(_JSON_HEADERS), iter_json_array(data, self._json)
+        else:
+            headers = list(_HTML_HEADERS)
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+        headers.append(("Content-Length", str(len(data))))
+        return "200 OK", headers, [data]
+
+    def finalize_response(
+        self,
+        environ,
+        status: str,
+        headers: list,
+        body: typing.Iterable[bytes],
+        compressed: typing.Optional[dict] = None,
+    ) -> typing.Tuple[typing.List[tuple], typing.Iterable[bytes]]:
+        """Adds the per-request parts of a response: CORS and compression
+
+        `compressed` memoises compressed bodies by content encoding.
+        """
+        if status.startswith("3"):
+            return headers, body
+        headers = self._handle_cors(environ, headers)
+        if self._compressor is not None:
+            body = self._compressor.apply(environ, headers, body, compressed)
+        return headers, body
+
+    def handle_css_or_js(self, environ, start_fn) -> typing.Iterable[bytes]:
         """Handles all HTTP requests for CSS or JS files"""
         path_to_file = environ["PATH_INFO"]
         extension = "javascript" if path_to_file.lower().endswith("js") else "css"
-        try:
-            with open("." + path_to_file) as f:
-                headers = self._handle_cors(
-                    environ, [("Content-Type", f"text/{extension}")]
-                )
-                start_fn("200 OK", headers)
-                utils.log_request(self._logger, environ)
-                return [f.read()]
-        except:
+        status, body = self._static.serve(
+            environ, start_fn, self._handle_cors(environ, [])
+        )
+        if body is None:
             headers = self._handle_cors(
                 environ, [("Content-Type", f"text/{extension}")]
             )
             start_fn("404 Not Found", headers)
-            utils.log_request(self._logger, environ, 404)
-            return [f"{extension.capitalize()} file not found"]
+            body = [f"{extension.capitalize()} file not found".encode()]
+        self._log_request(environ, status)
+        return body
 
-    def handle_asset(self, environ, start_fn) -> typing.List[str]:
+    def handle_asset(self, environ, start_fn) -> typing.Iterable[bytes]:
         """Handles all HTTP requests for asset-related files"""
-        path_to_img = environ["PATH_INFO"]
-        try:
-            with open("." + path_to_img, "rb") as f:
-                headers = self._handle_cors(environ, [("Content-Type", "text/webp")])
-                start_fn("200 OK", headers)
-                utils.log_request(self._logger, environ)
-                return [f.read()]
-        except:
+        status, body = self._static.serve(
+            environ, start_fn, self._handle_cors(environ, [])
+        )
+        if body is None:
             headers = self._handle_cors(environ, [("Content-Type", "text/plain")])
             start_fn("404 Not Found", headers)
-            utils.log_request(self._logger, environ, 404)
-            return ["Image file not found"]
+            body = [b"Image file not found"]
+        self._log_request(environ, status)
+        return body
+
+    def asset_url(self, path: str) -> str:
+        """The fingerprinted URL of a static file (see `WebApp.startup`)
+
+        Available in templates as `asset_url`, returns `path` unchanged for
+        files without a fingerprint.
+        """
+        return self._static.url_for(path)
+
+    def set_static_max_age(self, directory: str, seconds: int) -> None:
+        """Sets the Cache-Control max-age for static files under a directory"""
+        self._static.set_max_age(directory, seconds)
 
     def render_html(self, file_name: str, **kwargs) -> str:
         """Renders HTML files/templates"""
         renderer = self._renderer
+        if self.metrics is None:
+            return renderer.render_html_file(file_name, kwargs)
+        start = time.perf_counter()
         data = renderer.render_html_file(file_name, kwargs)
+        self.metrics.observe("render", file_name, time.perf_counter() - start)
         return data
 
     def _handle_cors(self, environ, headers: list) -> typing.List[tuple]:
         """Private method for handling CORS if it's enabled."""
         if self.cors:
             origin = environ.get("HTTP_ORIGIN")
-            cors = origin
-            if cors:
-                headers.extend(
-                    [
-                        ("Access-Control-Allow-Origin", origin),
-                        ("Access-Control-Allow-Credentials", "true"),
-                    ]
-                )
+            if origin and (self.cors is True or origin in self.cors):
+                headers.append(("Access-Control-Allow-Origin", origin))
+                headers.append(_CORS_CREDENTIALS)
+            # Even responses without CORS headers depend on the Origin, so
+            # caches must not hand them to other origins
+            headers.append(_VARY_ORIGIN)
 
             return headers
         else:
@@ -152,51 +550,210 @@ class BaseApp(object):
 
 
 class WebApp(BaseApp):
-    def __init__(self, *, cors=False, debug=False) -> None:
-        super().__init__(cors, debug)
+    def __init__(
+        self,
+        *,
+        cors=False,
+        debug=False,
+        max_body_size=16 * 1024 * 1024,
+        json_encoder=None,
+        compression=True,
+        access_log=True,
+    ) -> None:
+        # `json_encoder` is "orjson", "ujson", "json" or any object with a
+        # `dumps(obj) -> bytes` method, the fastest installed one by default.
+        # `compression` and `access_log` are True, False or a configured
+        # `Compressor`/`AccessLogger`
+        super().__init__(
+            cors, debug, max_body_size, json_encoder, compression, access_log
+        )
+        # ASGI entry point, e.g. `uvicorn main:app.asgi`
+        self.asgi = ASGIApp(self)
 
-    def set_html_dir(self, work_dir: str) -> None:
-        """Changes the HTML file directory. The default is 'html/'"""
-        self._renderer = Renderer(work_dir + "/")
+    def set_html_dir(
+        self,
+        work_dir: str,
+        *,
+        cache_size: int = 128,
+        auto_reload: bool = True,
+        precompile: bool = False,
+    ) -> None:
+        """Changes the HTML file directory. The default is 'html/'
+
+        Compiled templates are cached (up to `cache_size` of them). Pass
+        `auto_reload=False` in production to skip the mtime check on every
+        render, and `precompile=True` to compile every template right away.
+        """
+        globals_ = self._renderer.globals
+        self._renderer = Renderer(
+            work_dir + "/", cache_size=cache_size, auto_reload=auto_reload
+        )
+        self._renderer.globals = globals_
+        if precompile:
+            self._renderer.precompile()
+
+    def startup(
+        self,
+        *,
+        asset_dirs: typing.Iterable[str] = ("css", "js", "img", "static", "assets"),
+        fingerprint: bool = False,
+    ) -> dict:
+        """Gets everything ready before the first request, returns a summary
+
+        Freezes the routes, compiles every template in the HTML directory and
+        builds `self.manifest` from the static files under `asset_dirs`, so
+        the first requests don't pay for any of it. With `fingerprint`,
+        templates can use `asset_url("/css/style.css")` for content-hashed
+        URLs that browsers cache forever. Called by `run()` if it wasn't yet.
+        """
+        self._router.freeze()
+        templates = self._renderer.precompile()
+        self._renderer.globals["asset_url"] = self.asset_url
+        self.manifest = self._static.build_manifest(asset_dirs, fingerprint=fingerprint)
+        return {
+            "routes": {
+                route: endpoint.allowed_methods or ["*"]
+                for route, endpoint in self.routes.items()
+            },
+            "templates": templates,
+            "assets": self.manifest,
+        }
+
+    def enable_metrics(
+        self,
+        route: str = "/metrics",
+        *,
+        buckets: typing.Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Metrics:
+        """Starts collecting metrics and serves them at `route` for Prometheus
+
+        Each worker process keeps its own metrics.
+        """
+        self.metrics = Metrics(buckets)
+        for endpoint in self.routes.values():
+            if endpoint.extension is not None:
+                endpoint.extension.metrics = self.metrics
+
+        def metrics_endpoint(request: Request) -> Response:
+            return Response(self.metrics.render(), content_type=CONTENT_TYPE)
+
+        self.add_endpoint(route, metrics_endpoint, methods=["GET"])
+        return self.metrics
 
     def load_extension(self, ext):
         """Loads routes from extensions"""
-        for k, v in ext.routes.items():
-            if k in self.routes:
-                raise EndpointError(f"The endpoint {k} already exists")
-            self.routes[k] = v
+        # So `ext.render_html` is measured too
+        ext.metrics = self.metrics
+        ext._owner = self
+        for endpoint in ext.routes.values():
+            endpoint.extension = ext
+            self._add_route(endpoint)
+        self._compile_hooks()
+
+    def _dispatch(self, environ) -> typing.Optional[tuple]:
+        """Finds the endpoint and path parameters for page/API requests
+
+        Returns None when the request is for a static file instead. Routes
+        win over static files, so paths like `/price/1.5` still reach them.
+        """
+        path = environ["PATH_INFO"]
+        target = self._router.match(path)
+        if target is not None:
+            environ["pogweb.route"] = target[0].route
+            return target
+        if "text/html" in environ.get("HTTP_ACCEPT", "") or "." not in path:
+            environ["pogweb.route"] = "<unmatched>"
+            return self._not_found, None
+        environ["pogweb.route"] = "<static>"
+        return None
 
-    def __call__(self, environ, start_fn) -> typing.List[str]:
+    def _serve_static(self, environ, start_fn) -> typing.Iterable[bytes]:
+        accept = environ.get("HTTP_ACCEPT", "")
+        path = environ["PATH_INFO"]
+        if (
+            "text/css" in accept
+            or "text/javascript" in accept
+            or path.endswith(".js")
+            or path.endswith(".css")
+        ):
+            return self.handle_css_or_js(environ, start_fn)
+        return self.handle_asset(environ, start_fn)
+
+    def _internal_error(
+        self, environ
+    ) -> typing.Tuple[str, typing.List[tuple], typing.List[bytes]]:
+        """Logs the exception being handled and builds a 500 response"""
+        self._log_request(environ, 500)
+        error_log = traceback.format_exc()
+        traceback.print_exc()
+        body = "500 Internal Server Error"
+        if self._debug:
+            body += "\n\n" + error_log
+        return (
+            "500 Internal Server Error",
+            [("Content-Type", "text/plain")],
+            [body.encode("utf-8")],
+        )
+
+    def __call__(self, environ, start_fn) -> typing.Iterable[bytes]:
         """Called on EVERY single HTTP request"""
+        # Already set when called from the ASGI app
+        environ.setdefault("pogweb.start_time", time.perf_counter())
         try:
-            if "text/html" in environ["HTTP_ACCEPT"] or (
-                "." not in environ["PATH_INFO"]
-            ):
-                endpoint = self.routes.get(environ.get("PATH_INFO")) or self._not_found
-                return self.handle_request(environ, start_fn, endpoint)
-            elif (
-                "text/css" in environ["HTTP_ACCEPT"]
-                or "text/javascript" in environ["HTTP_ACCEPT"]
-                or environ["PATH_INFO"].endswith(".js")
-                or environ["PATH_INFO"].endswith(".css")
-            ):
-                return self.handle_css_or_js(environ, start_fn)
-            else:
-                return self.handle_asset(environ, start_fn)
+            target = self._dispatch(environ)
+            if target is not None:
+                return self.handle_request(environ, start_fn, *target)
+            return self._serve_static(environ, start_fn)
         except Exception:
-            utils.log_request(self._logger, environ, 500)
-            error_log = traceback.format_exc()
-            traceback.print_exc()
-            start_fn("500 Internal Server Error", [("Content-Type", "text/plain")])
-            if self._debug:
-                return ["500 Internal Server Error\n\n" + error_log]
-            return ["500 Internal Server Error"]
-
-    def run(self, *, port=8080) -> None:
-        """Runs the application on Waitress server"""
-        ip = socket.gethostbyname(socket.gethostname())
+            status, headers, body = self._internal_error(environ)
+            start_fn(status, headers)
+            return body
+
+    def run(self, *, port=8080, asgi=False, workers=1, max_requests=0) -> None:
+        """Runs the application on Waitress server
+
+        With `asgi=True` the app is served by PogWeb's own asyncio server
+        instead, awaiting `async def` endpoints on the event loop.
+
+        With `workers` above 1 the socket is bound once and shared by that
+        many forked worker processes (see `pogweb.workers.Arbiter`), each of
+        which is replaced after serving `max_requests` requests if it's set.
+
+        With admission control, Waitress gets enough threads for requests
+        over `max_in_flight` to be shed rather than queued.
+        """
+        if not self._router.frozen:
+            self.startup()
+        # No DNS lookup here, it can hang for seconds in containers
+        ip = "0.0.0.0"
         logging.basicConfig(
-            level=logging.DEBUG, format=f"%(name)s>> {ip} - %(message)s"
+            level=logging.DEBUG if self._debug else logging.INFO,
+            format=f"%(name)s>> {socket.gethostname()} - %(message)s",
         )
+        threads = 4
+        if self.admission is not None:
+            threads = self.admission.server_threads(threads)
+        if workers > 1:
+            utils.render_banner(
+                ip, port, f"{workers} {'asyncio' if asgi else 'Waitress'} workers"
+            )
+            Arbiter(
+                self,
+                port=port,
+                workers=workers,
+                max_requests=max_requests,
+                asgi=asgi,
+                threads=threads,
+            ).run()
+            return
+        if asgi:
+            utils.render_banner(ip, port, "asyncio")
+            try:
+                asyncio.run(
+                    server.serve(self.asgi, port=port, max_body_size=self.max_body_size)
+                )
+            except KeyboardInterrupt:
+                pass
+            return
         utils.render_banner(ip, port)
-        serve(self, port=port, _quiet=True)
+        serve(self, port=port, threads=threads, _quiet=True)
@@ -0,0 +1,427 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pogweb import utils
+from pogweb.errors import BadRequestError, RequestEntityTooLarge
+from pogweb.models import Request, Response
+from pogweb.caching import CachedResponse
+
+import asyncio
+import dataclasses
+import functools
+import inspect
+import io
+import sys
+import tempfile
+import time
+import typing
+
+__all__: typing.Final = ["ASGIApp", "build_environ"]
+
+# Request bodies bigger than this are spilled to a temporary file
+_SPOOL_SIZE = 1024 * 1024
+
+# Responses up to this size are encoded and compressed on the event loop,
+# bigger ones and JSON go to the thread pool so they can't stall it
+_INLINE_SIZE = 16 * 1024
+
+
+def _is_heavy(data) -> bool:
+    """Whether encoding an endpoint's return value could block the event loop"""
+    if isinstance(data, Response):
+        data = data.body
+    if isinstance(data, (str, bytes)):
+        return len(data) > _INLINE_SIZE
+    return isinstance(data, (dict, list)) or (
+        dataclasses.is_dataclass(data) and not isinstance(data, type)
+    )
+
+
+def build_environ(
+    scope: dict, body: typing.Union[bytes, typing.BinaryIO] = b""
+) -> dict:
+    """Builds a WSGI-style environ out of an ASGI HTTP scope
+
+    `body` is either the whole request body or a file positioned at its start.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        # WSGI paths are the raw bytes decoded as latin-1
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body) if isinstance(body, bytes) else body,
+        # The whole body is already here, so it can be read until EOF
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "asgi.scope": scope,
+        "pogweb.start_time": time.perf_counter(),
+    }
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + "," + value
+        environ[key] = value
+    return environ
+
+
+class ASGIApp(object):
+    """Serves a WebApp over ASGI
+
+    `async def` endpoints are awaited on the event loop, plain endpoints and
+    static files are run on a bounded thread pool so they never block it.
+    Routing, `Request` and response shaping are shared with the WSGI path.
+    """
+
+    def __init__(self, app, *, max_workers: int = 32) -> None:
+        self._app = app
+        self._max_workers = max_workers
+        self._executor: typing.Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self._max_workers, thread_name_prefix="pogweb"
+            )
+        return self._executor
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE) as body_file:
+            too_large = await self._read_body(scope, receive, body_file)
+            if too_large is None:
+                return
+            environ = build_environ(scope, body_file)
+            if too_large:
+                self._app._log_request(environ, 413)
+                status, headers, body = self._call_wsgi(
+                    environ, utils.handle_request_too_large
+                )
+            else:
+                status, headers, body = await self.handle(environ)
+            await self._send_response(send, receive, status, headers, body)
+
+    async def _read_body(
+        self, scope: dict, receive, body_file: typing.BinaryIO
+    ) -> typing.Optional[bool]:
+        """Copies the request body into `body_file`
+
+        Returns whether the body is over max_body_size, or None if the client
+        disconnected. Nothing is read when Content-Length is already too big.
+        """
+        limit = self._app.max_body_size
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                return True
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                return True
+            body_file.write(chunk)
+            if not message.get("more_body"):
+                body_file.seek(0)
+                return False
+
+    async def _send_response(self, send, receive, status, headers, body) -> None:
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": int(status[:3]),
+                    "headers": [
+                        (k.lower().encode("latin-1"), v.encode("latin-1"))
+                        for k, v in headers
+                    ],
+                }
+            )
+        except BaseException:
+            # The body is closed after it's sent, and it won't be sent now
+            if hasattr(body, "aclose"):
+                await body.aclose()
+            elif hasattr(body, "close"):
+                body.close()
+            raise
+        if hasattr(body, "__aiter__"):
+            await self._send_stream(send, receive, body)
+        else:
+            await self._send_body(send, body)
+
+    async def handle(
+        self, environ
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Runs a request through the app, returns the status, headers and body"""
+        app = self._app
+        loop = asyncio.get_running_loop()
+        try:
+            target = app._dispatch(environ)
+            if (
+                target is not None
+                and target[0] is not utils.handle_not_found
+                and not app._is_preflight(environ)
+            ):
+                endpoint, path_params = target
+                handler = endpoint.handler_for(environ["REQUEST_METHOD"])
+                if handler is not None:
+                    admission = app.admission
+                    if admission is None:
+                        return await self._handle_endpoint(
+                            environ, endpoint, handler, path_params
+                        )
+                    rejected = admission.admit(environ, endpoint)
+                    if rejected is not None:
+                        status, retry_after = rejected
+                        return self._call_wsgi(
+                            environ,
+                            functools.partial(
+                                app._reject, status=status, retry_after=retry_after
+                            ),
+                        )
+                    try:
+                        status, headers, body = await self._handle_endpoint(
+                            environ, endpoint, handler, path_params
+                        )
+                    except BaseException:
+                        admission.release()
+                        raise
+                    if isinstance(body, list):
+                        admission.release()
+                        return status, headers, body
+                    # Streams are released once they're sent, see `_send_response`
+                    return status, headers, admission.hold(body)
+            # 404s, 405s, CORS preflights and static files take the WSGI path
+            return await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        except RequestEntityTooLarge:
+            app._log_request(environ, 413)
+            return self._call_wsgi(environ, utils.handle_request_too_large)
+        except BadRequestError:
+            app._log_request(environ, 400)
+            return self._call_wsgi(environ, utils.handle_bad_request)
+        except Exception:
+            return app._internal_error(environ)
+
+    async def _handle_endpoint(
+        self, environ, endpoint, handler: typing.Callable, path_params: dict
+    ) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        app = self._app
+        request = Request(environ, path_params, app.max_body_size)
+        if app.metrics is None:
+            status, headers, body = await self._respond_with_hooks(
+                environ, endpoint.hooks, handler, request
+            )
+        else:
+            app.metrics.enter(endpoint.route)
+            try:
+                status, headers, body = await self._respond_with_hooks(
+                    environ, endpoint.hooks, handler, request
+                )
+            finally:
+                app.metrics.exit(endpoint.route)
+        app._log_request(environ, int(status[:3]), headers)
+        return status, headers, body
+
+    async def _call_handler(self, handler: typing.Callable, request: Request):
+        metrics = self._app.metrics
+        if metrics is None:
+            return await self._run_handler(handler, request)
+        start = time.perf_counter()
+        data = await self._run_handler(handler, request)
+        metrics.observe(
+            "handler",
+            request.environ.get("pogweb.route", ""),
+            time.perf_counter() - start,
+        )
+        return data
+
+    async def _run_handler(self, handler: typing.Callable, *args):
+        """Awaits async handlers/hooks, runs the others on the thread pool"""
+        if inspect.iscoroutinefunction(handler):
+            return await handler(*args)
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, handler, *args)
+        if inspect.iscoroutine(data):
+            data = await data
+        return data
+
+    async def _respond_with_hooks(
+        self,
+        environ,
+        hooks: typing.Optional[tuple],
+        handler: typing.Callable,
+        request: Request,
+    ):
+        if hooks is None:
+            return await self._respond(environ, handler, request)
+        app = self._app
+        before, after = hooks
+        for hook in before:
+            data = await self._run_handler(hook, request)
+            if data is not None:
+                status, headers, body = await self._encode(environ, data)
+                memo = None
+                break
+        else:
+            status, headers, body, memo = await self._encoded(environ, handler, request)
+        if after:
+            response = status, headers, body
+            chunk = body[0] if memo is not None else None
+            for hook in after:
+                response = await self._run_handler(hook, request, response) or response
+            if memo is not None and not app._same_body(body, response[2], chunk):
+                memo = None  # The memoised compressed bodies no longer match
+            status, headers, body = response
+        return await self._finalize(environ, status, headers, body, memo)
+
+    async def _respond(self, environ, handler: typing.Callable, request: Request):
+        encoded = await self._encoded(environ, handler, request)
+        return await self._finalize(environ, *encoded)
+
+    async def _encode(self, environ, data) -> tuple:
+        if not _is_heavy(data):
+            return self._app.encode_response(environ, data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._app.encode_response, environ, data
+        )
+
+    async def _finalize(self, environ, status, headers, body, memo) -> tuple:
+        """Adds CORS and compression, on the thread pool for big bodies"""
+        if not isinstance(body, list) or sum(map(len, body)) <= _INLINE_SIZE:
+            return self._app._finalize(environ, status, headers, body, memo)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._app._finalize, environ, status, headers, body, memo
+        )
+
+    async def _encoded(self, environ, handler: typing.Callable, request: Request):
+        """The response before CORS and compression, see `WebApp._encoded`"""
+        app = self._app
+        policy = getattr(handler, "cache_policy", None)
+        if policy is None or not policy.applies_to(request):
+            data = await self._call_handler(handler, request)
+            return (*await self._encode(environ, data), None)
+
+        async def compute():
+            data = await self._call_handler(handler, request)
+            return CachedResponse.wrap(*await self._encode(environ, data))
+
+        value = await app.response_cache.get_or_set_async(
+            policy.key_for(request), policy.ttl, compute
+        )
+        return app._from_cache(value)
+
+    def _call_wsgi(self, environ, wsgi_app=None) -> tuple:
+        """Calls a WSGI callable (the app by default), capturing its response"""
+        response = []
+
+        def start_fn(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        body = (wsgi_app or self._app)(environ, start_fn)
+        return response[0], response[1], body
+
+    async def _send_body(self, send, body) -> None:
+        if isinstance(body, list):
+            for i, chunk in enumerate(body):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": i < len(body) - 1,
+                    }
+                )
+            if not body:
+                await send({"type": "http.response.body", "body": b""})
+            return
+
+        # Lazy bodies (e.g. files) are read on the thread pool, chunk by chunk
+        loop = asyncio.get_running_loop()
+        iterator = iter(body)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    async def _send_stream(self, send, receive, body) -> None:
+        """Sends an async body as it's produced, until the client disconnects"""
+
+        async def wait_for_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        iterator = body.__aiter__()
+        try:
+            while True:
+                chunk = asyncio.ensure_future(iterator.__anext__())
+                await asyncio.wait(
+                    (chunk, disconnected), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not chunk.done():
+                    chunk.cancel()
+                    await asyncio.wait((chunk,))
+                    return
+                try:
+                    data = chunk.result()
+                except StopAsyncIteration:
+                    break
+                await send(
+                    {"type": "http.response.body", "body": data, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
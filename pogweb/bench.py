@@ -0,0 +1,428 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from pogweb import WebApp, Request
+from pogweb.encoding import get_json_encoder
+from pogweb.static import StaticFiles
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import signal
+import socket
+import sys
+import tempfile
+import time
+import typing
+
+__all__: typing.Final = [
+    "BenchResult",
+    "make_app",
+    "make_environ",
+    "run_micro",
+    "run_http",
+    "compare",
+    "main",
+]
+
+_PAYLOAD: typing.Final = {
+    "users": [
+        {"id": i, "name": f"user{i}", "active": i % 2 == 0, "score": i * 1.5}
+        for i in range(50)
+    ]
+}
+
+
+class BenchResult(object):
+    """Throughput and latency percentiles of a single benchmark"""
+
+    __slots__ = ("name", "requests", "seconds", "latencies", "errors")
+
+    def __init__(
+        self,
+        name: str,
+        requests: int,
+        seconds: float,
+        latencies: typing.List[float],
+        errors: int = 0,
+    ) -> None:
+        self.name = name
+        self.requests = requests
+        self.seconds = seconds
+        self.latencies = sorted(latencies)
+        self.errors = errors
+
+    @property
+    def rate(self) -> float:
+        """Requests (or calls) per second"""
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Latency in seconds at percentile `p` (0-100)"""
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(len(self.latencies) * p / 100))
+        return self.latencies[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "seconds": round(self.seconds, 4),
+            "rate": round(self.rate, 1),
+            "p50_us": round(self.percentile(50) * 1e6, 1),
+            "p99_us": round(self.percentile(99) * 1e6, 1),
+            "p999_us": round(self.percentile(99.9) * 1e6, 1),
+            "errors": self.errors,
+        }
+
+    def __str__(self) -> str:
+        data = self.to_dict()
+        return (
+            f"{self.name:<24} {data['rate']:>12,.0f}/s   p50 {data['p50_us']:>9,.1f}us"
+            f"   p99 {data['p99_us']:>9,.1f}us   p999 {data['p999_us']:>9,.1f}us"
+            + (f"   errors {self.errors}" if self.errors else "")
+        )
+
+
+def make_app(work_dir: str) -> WebApp:
+    """Builds the app that is benchmarked, with its files under `work_dir`"""
+    html_dir = os.path.join(work_dir, "html")
+    os.makedirs(html_dir, exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "css"), exist_ok=True)
+    with open(os.path.join(html_dir, "index.html"), "w") as f:
+        f.write(
+            "<html><body><h1>{{ title }}</h1><ul>"
+            "{% for item in items %}<li>{{ item }}</li>{% endfor %}"
+            "</ul></body></html>"
+        )
+    with open(os.path.join(work_dir, "css", "style.css"), "w") as f:
+        f.write("body { color: #333; }\n" * 200)
+
+    app = WebApp(access_log=False, compression=False)
+    app.set_html_dir(html_dir, auto_reload=False, precompile=True)
+    # Static files are looked up relative to `work_dir` instead of the cwd
+    app._static = StaticFiles(work_dir)
+
+    @app.endpoint("/")
+    def index(request: Request) -> str:
+        return "Hello, World!"
+
+    @app.endpoint("/json")
+    def json_endpoint(request: Request) -> dict:
+        return _PAYLOAD
+
+    @app.endpoint("/users/<int:user_id>/posts/<int:post_id>")
+    def post(request: Request) -> dict:
+        return request.path_params
+
+    @app.endpoint("/render")
+    def render(request: Request) -> str:
+        return app.render_html("index.html", title="Bench", items=range(20))
+
+    return app
+
+
+def make_environ(path: str, method: str = "GET", accept: str = "*/*") -> dict:
+    """A synthetic WSGI environ for calling the app directly"""
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_ACCEPT": accept,
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+    }
+
+
+def _time_calls(
+    name: str, func: typing.Callable, duration: float, batch: int = 100
+) -> BenchResult:
+    """Calls `func` repeatedly for about `duration` seconds"""
+    latencies = []
+    calls = 0
+    clock = time.perf_counter
+    end = clock() + duration
+    start = clock()
+    while clock() < end:
+        for _ in range(batch):
+            t0 = clock()
+            func()
+            latencies.append(clock() - t0)
+        calls += batch
+    return BenchResult(name, calls, clock() - start, latencies)
+
+
+def _call_app(app: WebApp, path: str, accept: str = "*/*") -> typing.Callable:
+    def start_fn(status, headers, exc_info=None) -> None:
+        pass
+
+    def call() -> None:
+        body = app(make_environ(path, accept=accept), start_fn)
+        for _ in body:
+            pass
+        if hasattr(body, "close"):
+            body.close()
+
+    return call
+
+
+def run_micro(
+    app: WebApp, duration: float = 1.0, only: typing.Optional[str] = None
+) -> typing.List[BenchResult]:
+    """Runs the in-process benchmarks, calling the WSGI app directly"""
+    encoder = get_json_encoder()
+    benchmarks = {
+        "route_static": lambda: app._router.match("/json"),
+        "route_params": lambda: app._router.match("/users/42/posts/7"),
+        "json_encode": lambda: encoder.dumps(_PAYLOAD),
+        "render_template": lambda: app.render_html(
+            "index.html", title="Bench", items=range(20)
+        ),
+        "wsgi_text": _call_app(app, "/"),
+        "wsgi_json": _call_app(app, "/json"),
+        "wsgi_params": _call_app(app, "/users/42/posts/7"),
+        "wsgi_render": _call_app(app, "/render"),
+        "wsgi_static": _call_app(app, "/css/style.css", "text/css"),
+        "wsgi_not_found": _call_app(app, "/missing"),
+    }
+    results = []
+    for name, func in benchmarks.items():
+        if only and only not in name:
+            continue
+        func()  # warm up caches
+        results.append(_time_calls(f"micro.{name}", func, duration))
+    return results
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    """Reads one HTTP/1.1 response, returns its status code"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split(b" ", 2)[1])
+    length = None
+    chunked = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _load(
+    host: str, port: int, path: str, concurrency: int, duration: float
+) -> BenchResult:
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: */*\r\n\r\n"
+    ).encode("latin-1")
+    latencies = []
+    errors = 0
+    clock = time.perf_counter
+    end = clock() + duration
+
+    async def client() -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while clock() < end:
+                t0 = clock()
+                writer.write(request)
+                status = await _read_response(reader)
+                latencies.append(clock() - t0)
+                if status >= 500:
+                    errors += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    start = clock()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return BenchResult(
+        f"http.{path}", len(latencies), clock() - start, latencies, errors
+    )
+
+
+def _serve_forked(app: WebApp, server: str) -> typing.Tuple[int, int]:
+    """Starts the app in a child process, returns its PID and port"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1024)
+    port = sock.getsockname()[1]
+    pid = os.fork()
+    if pid:
+        sock.close()
+        return pid, port
+    try:
+        signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+        if server == "waitress":
+            from waitress import serve
+
+            # Saturating the thread pool is the point, don't warn about it
+            logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+            serve(app, sockets=[sock], _quiet=True)
+        else:
+            from pogweb import server as asyncio_server
+
+            asyncio.run(asyncio_server.serve(app.asgi, sock=sock))
+    finally:
+        os._exit(0)
+
+
+def _wait_until_up(port: int, timeout: float = 10.0) -> None:
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > end:
+                raise
+            time.sleep(0.05)
+
+
+def run_http(
+    app: WebApp,
+    *,
+    server: str = "asyncio",
+    paths: typing.Iterable[str] = ("/", "/json", "/render"),
+    concurrency: int = 50,
+    duration: float = 3.0,
+) -> typing.List[BenchResult]:
+    """Load tests the app over HTTP, served by a local server in a child process
+
+    `server` is "asyncio" (PogWeb's ASGI server) or "waitress". Every one
+    of the `concurrency` clients keeps its connection alive and sends its
+    next request as soon as the previous response arrived.
+    """
+    pid, port = _serve_forked(app, server)
+    try:
+        _wait_until_up(port)
+        results = []
+        for path in paths:
+            asyncio.run(_load("127.0.0.1", port, path, concurrency, min(duration, 0.2)))
+            result = asyncio.run(_load("127.0.0.1", port, path, concurrency, duration))
+            result.name = f"http.{server}.{path}"
+            results.append(result)
+        return results
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def compare(
+    results: typing.Dict[str, dict], baseline: typing.Dict[str, dict], threshold: float
+) -> typing.List[str]:
+    """Describes every benchmark that got slower than `baseline` by `threshold`"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["rate"] and current["rate"] < previous["rate"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {current['rate']:,.0f}/s, was {previous['rate']:,.0f}/s"
+            )
+        if previous["p99_us"] and current["p99_us"] > previous["p99_us"] * (
+            1 + threshold
+        ):
+            regressions.append(
+                f"{name}: p99 {current['p99_us']:,.1f}us, "
+                f"was {previous['p99_us']:,.1f}us"
+            )
+    return regressions
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pogweb.bench", description="Benchmarks PogWeb"
+    )
+    parser.add_argument("--micro", action="store_true", help="only micro benchmarks")
+    parser.add_argument("--http", action="store_true", help="only HTTP load tests")
+    parser.add_argument(
+        "--filter", help="only micro benchmarks with this in their name"
+    )
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per run")
+    parser.add_argument("--server", choices=("asyncio", "waitress"), default="asyncio")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression (default 0.1, i.e. 10%%)",
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        app = make_app(work_dir)
+        results = []
+        if not args.http:
+            results += _report(run_micro(app, args.duration, args.filter))
+        if not args.micro:
+            results += _report(
+                run_http(
+                    app,
+                    server=args.server,
+                    concurrency=args.concurrency,
+                    duration=args.duration,
+                )
+            )
+
+    data = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {result.name: result.to_dict() for result in results},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(data["results"], baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+def _report(results: typing.List[BenchResult]) -> typing.List[BenchResult]:
+    for result in results:
+        print(result)
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from collections import OrderedDict
+
+import abc
+import asyncio
+import functools
+import sys
+import threading
+import time
+import typing
+
+__all__: typing.Final = [
+    "CachePolicy",
+    "cached",
+    "CachedResponse",
+    "CacheBackend",
+    "MemoryBackend",
+    "ResponseCache",
+]
+
+
+class CachePolicy(object):
+    """Describes how the responses of an endpoint are cached
+
+    The cache key always contains the path. `vary_query` adds either every
+    query argument (True) or only the named ones, `vary_headers` adds the
+    given request headers (e.g. "Accept-Language"). A custom `key` function
+    taking the request replaces all of that. Only `methods` are cached, HEAD
+    requests share their entries with GET.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        *,
+        vary_query: typing.Union[bool, typing.Iterable[str]] = True,
+        vary_headers: typing.Iterable[str] = (),
+        methods: typing.Iterable[str] = ("GET", "HEAD"),
+        key: typing.Optional[typing.Callable] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.vary_query = (
+            vary_query if isinstance(vary_query, bool) else tuple(vary_query)
+        )
+        self.vary_headers = tuple(
+            "HTTP_" + h.upper().replace("-", "_") for h in vary_headers
+        )
+        self.methods = frozenset(m.upper() for m in methods)
+        self._key = key
+
+    def applies_to(self, request) -> bool:
+        return request.method in self.methods
+
+    def key_for(self, request) -> str:
+        if self._key is not None:
+            return self._key(request)
+        environ = request.environ
+        method = "GET" if request.method == "HEAD" else request.method
+        parts = [method, environ.get("PATH_INFO", "")]
+        if self.vary_query is True:
+            parts.append(
+                "&".join(
+                    f"{k}={v}"
+                    for k, values in sorted(request.query_lists.items())
+                    for v in values
+                )
+            )
+        elif self.vary_query:
+            args = request.query_lists
+            parts.extend(f"{k}={args.get(k)}" for k in self.vary_query)
+        parts.extend(environ.get(h, "") for h in self.vary_headers)
+        return "\x00".join(parts)
+
+
+def cached(ttl: float, **kwargs):
+    """Caches the responses of an endpoint handler for `ttl` seconds
+
+    Takes the same keyword arguments as `CachePolicy`. Put it under the
+    `@app.endpoint(...)` decorator.
+    """
+
+    def decorator(func: typing.Callable):
+        func.cache_policy = CachePolicy(ttl, **kwargs)
+        return func
+
+    return decorator
+
+
+class _Variants(dict):
+    """Compressed bodies keyed by content encoding
+
+    `on_grow` is told how many bytes each new body adds, so the backend
+    holding the response can account for them.
+    """
+
+    __slots__ = ("on_grow",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.on_grow: typing.Optional[typing.Callable[[int], None]] = None
+
+    def __setitem__(self, encoding: str, data: bytes) -> None:
+        grown = len(data) - len(self.get(encoding, b""))
+        super().__setitem__(encoding, data)
+        if self.on_grow is not None and grown:
+            self.on_grow(grown)
+
+
+class CachedResponse(object):
+    """A fully encoded response, without the per-request CORS/compression"""
+
+    __slots__ = ("status", "headers", "body", "variants")
+
+    def __init__(self, status: str, headers: tuple, body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        # Compressed bodies, memoised per content encoding
+        self.variants = _Variants()
+
+    @classmethod
+    def wrap(cls, status: str, headers: list, body):
+        """Wraps a response if it can be cached, returns it untouched if not
+
+        Only complete 200 responses without cookies are cached.
+        """
+        if (
+            not status.startswith("200")
+            or not isinstance(body, list)
+            or any(name.lower() == "set-cookie" for name, _ in headers)
+        ):
+            return status, headers, body
+        return cls(status, tuple(headers), b"".join(body))
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values()) + 256
+
+    def __getstate__(self):
+        return self.status, self.headers, self.body
+
+    def __setstate__(self, state) -> None:
+        self.status, self.headers, self.body = state
+        self.variants = _Variants()
+
+
+class CacheBackend(abc.ABC):
+    """Interface for response cache storage
+
+    Implement it on top of a shared store to share cached responses between
+    worker processes. Values are `CachedResponse` objects, which pickle.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> typing.Optional[CachedResponse]: ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None: ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    @abc.abstractmethod
+    def clear(self) -> None: ...
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU cache bounded by a memory budget (in bytes)"""
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024) -> None:
+        self._max_size = max_size
+        self._size = 0
+        self._entries: "OrderedDict[str, typing.Tuple[float, int, typing.Any]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size_of(value) -> int:
+        size = getattr(value, "size", None)
+        return size if size is not None else sys.getsizeof(value)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, size, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float) -> None:
+        size = self._size_of(value)
+        if size > self._max_size:
+            return
+        if isinstance(value, CachedResponse):
+            # Compressed variants memoised later count against the budget too
+            value.variants.on_grow = functools.partial(self._grow, key, value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._size += size
+            self._evict()
+
+    def _grow(self, key: str, value, size: int) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] is not value:
+                return
+            self._entries[key] = (entry[0], entry[1] + size, value)
+            self._size += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self._max_size:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class ResponseCache(object):
+    """Looks up cached responses, computing each missing key only once
+
+    Concurrent misses on the same key wait for the first one to finish
+    instead of all running the endpoint (cache stampede protection).
+    """
+
+    def __init__(
+        self, backend: typing.Optional[CacheBackend] = None, wait_timeout: float = 30.0
+    ) -> None:
+        self.backend = backend or MemoryBackend()
+        self._wait_timeout = wait_timeout
+        self._inflight: typing.Dict[str, threading.Event] = {}
+        self._async_inflight: typing.Dict[str, asyncio.Event] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, key: str, value, ttl: float) -> None:
+        if isinstance(value, CachedResponse):
+            self.backend.set(key, value, ttl)
+
+    def get_or_set(self, key: str, ttl: float, compute: typing.Callable):
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(self._wait_timeout)
+            value = self.backend.get(key)
+            # The leader failed or its response can't be cached
+            return value if value is not None else compute()
+        try:
+            value = compute()
+            self._store(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    async def get_or_set_async(self, key: str, ttl: float, compute: typing.Callable):
+        """Same as `get_or_set`, for coroutine `compute` functions"""
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        event = self._async_inflight.get(key)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), self._wait_timeout)
+            except asyncio.TimeoutError:
+                pass
+            value = self.backend.get(key)
+            return value if value is not None else await compute()
+        event = self._async_inflight[key] = asyncio.Event()
+        try:
+            value = await compute()
+            self._store(key, value, ttl)
+            return value
+        finally:
+            del self._async_inflight[key]
+            event.set()
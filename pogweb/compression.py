@@ -0,0 +1,186 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import typing
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+__all__: typing.Final = ["Compressor", "COMPRESSIBLE_TYPES"]
+
+COMPRESSIBLE_TYPES: typing.Final = frozenset(
+    [
+        "text/html",
+        "text/css",
+        "text/plain",
+        "text/javascript",
+        "text/xml",
+        "text/csv",
+        "text/event-stream",
+        "application/javascript",
+        "application/json",
+        "application/xml",
+        "application/manifest+json",
+        "image/svg+xml",
+    ]
+)
+
+
+class Compressor(object):
+    """Negotiates and applies gzip/brotli content encoding
+
+    Only bodies of an allowlisted MIME type and at least `min_size` bytes are
+    compressed. Brotli is used when the `brotli` package is installed and the
+    client accepts it.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_size: int = 512,
+        mime_types: typing.Iterable[str] = COMPRESSIBLE_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.min_size = min_size
+        self.mime_types = frozenset(mime_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def negotiate(self, accept_encoding: str) -> typing.Optional[str]:
+        """Picks the preferred encoding out of an Accept-Encoding header"""
+        if not accept_encoding:
+            return None
+        weights = {}
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[name.strip().lower()] = q
+        best, best_q = None, 0.0
+        for encoding in self.encodings:
+            q = weights.get(encoding, weights.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def compressible(self, content_type: typing.Optional[str]) -> bool:
+        if not content_type:
+            return False
+        return content_type.split(";", 1)[0].strip().lower() in self.mime_types
+
+    def compress(self, data: bytes, encoding: str, *, best: bool = False) -> bytes:
+        """Compresses a whole body, `best` trades speed for size (for caching)"""
+        if encoding == "br":
+            return brotli.compress(data, quality=11 if best else self.brotli_quality)
+        compressor = zlib.compressobj(9 if best else self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(
+        self, chunks: typing.Iterable[bytes], encoding: str
+    ) -> typing.Iterator[bytes]:
+        """Compresses a body on the fly, flushing after every chunk"""
+        process, finish = self._stream_compressor(encoding)
+        try:
+            for chunk in chunks:
+                out = process(chunk)
+                if out:
+                    yield out
+            yield finish()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    async def compress_async_stream(
+        self, chunks: typing.AsyncIterable[bytes], encoding: str
+    ) -> typing.AsyncIterator[bytes]:
+        """Same as `compress_stream`, for async bodies"""
+        process, finish = self._stream_compressor(encoding)
+        try:
+            async for chunk in chunks:
+                out = process(chunk)
+                if out:
+                    yield out
+            yield finish()
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+
+    def _stream_compressor(self, encoding: str) -> typing.Tuple[typing.Callable, ...]:
+        """Returns `process(chunk)` and `finish()` functions for an encoding"""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return (
+                lambda chunk: compressor.process(chunk) + compressor.flush(),
+                compressor.finish,
+            )
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return (
+            lambda chunk: compressor.compress(chunk)
+            + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+    def apply(
+        self,
+        environ,
+        headers: list,
+        body: typing.Iterable[bytes],
+        memo: typing.Optional[dict] = None,
+    ):
+        """Compresses a response if the client and content allow it
+
+        Updates `headers` in place and returns the new body. Compressed bodies
+        are looked up in and saved to `memo` (keyed by encoding) if given.
+        """
+        content_type = None
+        for name, value in headers:
+            name = name.lower()
+            if name == "content-type":
+                content_type = value
+            elif name == "content-encoding":
+                return body
+        if not self.compressible(content_type):
+            return body
+        if isinstance(body, list):
+            data = b"".join(body)
+            if len(data) < self.min_size:
+                return body
+        headers.append(("Vary", "Accept-Encoding"))
+        encoding = self.negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return body
+
+        headers[:] = [h for h in headers if h[0].lower() != "content-length"]
+        if isinstance(body, list):
+            if memo is not None and encoding in memo:
+                data = memo[encoding]
+            else:
+                data = self.compress(data, encoding)
+                if memo is not None:
+                    memo[encoding] = data
+            headers.append(("Content-Length", str(len(data))))
+            body = [data]
+        elif hasattr(body, "__aiter__"):
+            body = self.compress_async_stream(body, encoding)
+        else:
+            body = self.compress_stream(body, encoding)
+        headers.append(("Content-Encoding", encoding))
+        return body
@@ -0,0 +1,119 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import typing
+import uuid
+
+__all__: typing.Final = ["JSONEncoder", "get_json_encoder", "iter_json_array"]
+
+
+def _default(obj):
+    """Converts values the JSON libraries don't know about"""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONEncoder(object):
+    """Serializes objects to UTF-8 encoded JSON bytes"""
+
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(
+            obj, default=_default, separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+
+
+class _OrjsonEncoder(JSONEncoder):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj) -> bytes:
+        return self._dumps(obj, default=_default, option=self._option)
+
+
+class _UjsonEncoder(JSONEncoder):
+    name = "ujson"
+
+    def __init__(self) -> None:
+        import ujson
+
+        self._dumps = ujson.dumps
+
+    def dumps(self, obj) -> bytes:
+        return self._dumps(obj, default=_default, ensure_ascii=False).encode("utf-8")
+
+
+_ENCODERS: typing.Final = {
+    "orjson": _OrjsonEncoder,
+    "ujson": _UjsonEncoder,
+    "json": JSONEncoder,
+}
+
+
+def get_json_encoder(
+    encoder: typing.Union[str, JSONEncoder, None] = None,
+) -> JSONEncoder:
+    """Returns a JSON encoder by name, or the fastest one that's installed
+
+    Anything with a `dumps(obj) -> bytes` method can be passed in as well.
+    """
+    if encoder is None:
+        for cls in _ENCODERS.values():
+            try:
+                return cls()
+            except ImportError:
+                continue
+    if isinstance(encoder, str):
+        return _ENCODERS[encoder]()
+    return encoder
+
+
+def iter_json_array(
+    items: typing.Iterable, encoder: JSONEncoder, batch_size: int = 256
+) -> typing.Iterator[bytes]:
+    """Encodes an iterable as a JSON array, one batch of items at a time
+
+    The array never exists as a whole in memory, which keeps huge result sets
+    (e.g. rows from a database cursor) cheap to send.
+    """
+    dumps = encoder.dumps
+    batch = [b"["]
+    first = True
+    for item in items:
+        if not first:
+            batch.append(b",")
+        first = False
+        batch.append(dumps(item))
+        if len(batch) >= 2 * batch_size:
+            yield b"".join(batch)
+            batch = []
+    batch.append(b"]")
+    yield b"".join(batch)
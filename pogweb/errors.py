@@ -20,3 +20,15 @@ class EndpointError(PogError):
     """Raised when an existing endpoint is added again"""
 
     pass
+
+
+class BadRequestError(PogError):
+    """Raised when a request body can't be parsed"""
+
+    pass
+
+
+class RequestEntityTooLarge(PogError):
+    """Raised when a request body is bigger than the app's max_body_size"""
+
+    pass
@@ -0,0 +1,194 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import bisect
+import threading
+import typing
+
+__all__: typing.Final = ["Metrics", "DEFAULT_BUCKETS", "CONTENT_TYPE"]
+
+# Latency buckets in seconds, from half a millisecond to 10 seconds
+DEFAULT_BUCKETS: typing.Final = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE: typing.Final = "text/plain; version=0.0.4; charset=utf-8"
+
+# Phase -> (metric name, label name, help text)
+PHASES: typing.Final = {
+    "request": (
+        "pogweb_request_duration_seconds",
+        "route",
+        "Time from receiving a request to returning its response.",
+    ),
+    "handler": (
+        "pogweb_handler_duration_seconds",
+        "route",
+        "Time spent in endpoint handlers.",
+    ),
+    "serialize": (
+        "pogweb_serialize_duration_seconds",
+        "route",
+        "Time spent encoding endpoint return values.",
+    ),
+    "render": (
+        "pogweb_render_duration_seconds",
+        "template",
+        "Time spent rendering HTML templates.",
+    ),
+}
+
+
+class _Shard(object):
+    """The counters of a single thread, only ever written by that thread"""
+
+    __slots__ = ("requests", "in_progress", "histograms")
+
+    def __init__(self) -> None:
+        self.requests = {}
+        self.in_progress = {}
+        self.histograms = {}
+
+
+class Metrics(object):
+    """Request counters and latency histograms, in the Prometheus format
+
+    Every thread records into its own shard without taking a lock, shards
+    are only summed up when the metrics are exported. Histograms have fixed
+    buckets, so recording a value is a bisect and two additions.
+    """
+
+    def __init__(self, buckets: typing.Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def count_request(
+        self, route: str, method: str, status: int, seconds: float
+    ) -> None:
+        """Records a finished request and how long it took"""
+        shard = self._shard()
+        key = (route, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        self._observe(shard, "request", route, seconds)
+
+    def observe(self, phase: str, label: str, seconds: float) -> None:
+        """Records the duration of a phase ("handler", "serialize" or "render")"""
+        self._observe(self._shard(), phase, label, seconds)
+
+    def _observe(self, shard: _Shard, phase: str, label: str, seconds: float) -> None:
+        key = (phase, label)
+        histogram = shard.histograms.get(key)
+        if histogram is None:
+            # A count per bucket, one for +Inf and the sum at the end
+            histogram = shard.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+
+    def enter(self, route: str) -> None:
+        """Marks a request to `route` as in progress"""
+        in_progress = self._shard().in_progress
+        in_progress[route] = in_progress.get(route, 0) + 1
+
+    def exit(self, route: str) -> None:
+        """Marks a request to `route` as done, may run on another thread"""
+        in_progress = self._shard().in_progress
+        in_progress[route] = in_progress.get(route, 0) - 1
+
+    def collect(self) -> typing.Tuple[dict, dict, dict]:
+        """Sums up every thread's shard into requests, in-progress and histograms"""
+        with self._lock:
+            shards = list(self._shards)
+        requests = {}
+        in_progress = {}
+        histograms = {}
+        for shard in shards:
+            # Copying a dict is atomic, the owning thread may keep writing
+            for key, count in shard.requests.copy().items():
+                requests[key] = requests.get(key, 0) + count
+            for key, count in shard.in_progress.copy().items():
+                in_progress[key] = in_progress.get(key, 0) + count
+            for key, values in shard.histograms.copy().items():
+                total = histograms.get(key)
+                if total is None:
+                    histograms[key] = list(values)
+                else:
+                    histograms[key] = [a + b for a, b in zip(total, values)]
+        return requests, in_progress, histograms
+
+    def render(self) -> str:
+        """Exports every metric in the Prometheus text format"""
+        requests, in_progress, histograms = self.collect()
+        lines = [
+            "# HELP pogweb_requests_total Total HTTP requests.",
+            "# TYPE pogweb_requests_total counter",
+        ]
+        for (route, method, status), count in sorted(requests.items()):
+            labels = _labels(route=route, method=method, status=str(status))
+            lines.append(f"pogweb_requests_total{{{labels}}} {count}")
+        lines += [
+            "# HELP pogweb_requests_in_progress HTTP requests being handled.",
+            "# TYPE pogweb_requests_in_progress gauge",
+        ]
+        for route, count in sorted(in_progress.items()):
+            lines.append(
+                f"pogweb_requests_in_progress{{{_labels(route=route)}}} {count}"
+            )
+
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for phase, (name, label_name, help_text) in PHASES.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (key, label), values in sorted(histograms.items()):
+                if key != phase:
+                    continue
+                labels = _labels(**{label_name: label})
+                cumulative = 0
+                for bound, count in zip(bounds, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {_number(values[-1])}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value))
@@ -9,12 +9,27 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 
 """
 
-from urllib.parse import parse_qs
+from pogweb.errors import EndpointError, BadRequestError, RequestEntityTooLarge
+from pogweb.multipart import MultipartParser
+from urllib.parse import parse_qsl
+from http import HTTPStatus
+from http.cookies import SimpleCookie
 
 
 import typing
 
-__all__: typing.Final = ["Request", "ImmutableDict", "_Redirect", "Endpoint"]
+__all__: typing.Final = [
+    "Request",
+    "Response",
+    "ImmutableDict",
+    "_Redirect",
+    "Endpoint",
+]
+
+# Status lines are built once, e.g. 404 -> "404 Not Found"
+_STATUS_LINES: typing.Final = {
+    status.value: f"{status.value} {status.phrase}" for status in HTTPStatus
+}
 
 
 class _Redirect(object):
@@ -24,6 +39,99 @@ class _Redirect(object):
         self.url = url
 
 
+class Response(object):
+    """A response with its own status, headers and cookies
+
+    The body can be bytes, a string or an iterable of bytes, which is sent
+    as is (without a Content-Length).
+    """
+
+    __slots__ = ("body", "status", "headers", "content_type", "_cookies")
+
+    def __init__(
+        self,
+        body: typing.Union[bytes, str, typing.Iterable[bytes]] = b"",
+        status: int = 200,
+        headers: typing.Union[dict, typing.List[tuple], None] = None,
+        *,
+        content_type: typing.Optional[str] = "text/html",
+    ) -> None:
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.content_type = content_type
+        self._cookies = None
+
+    def set_cookie(
+        self,
+        name: str,
+        value: str,
+        *,
+        max_age: typing.Optional[int] = None,
+        path: str = "/",
+        domain: typing.Optional[str] = None,
+        secure: bool = False,
+        httponly: bool = False,
+        samesite: typing.Optional[str] = None,
+    ) -> None:
+        """Adds a Set-Cookie header to the response"""
+        cookie = SimpleCookie()
+        cookie[name] = value
+        morsel = cookie[name]
+        morsel["path"] = path
+        if max_age is not None:
+            morsel["max-age"] = max_age
+        if domain is not None:
+            morsel["domain"] = domain
+        if secure:
+            morsel["secure"] = True
+        if httponly:
+            morsel["httponly"] = True
+        if samesite is not None:
+            morsel["samesite"] = samesite
+        if self._cookies is None:
+            self._cookies = []
+        self._cookies.append(morsel.OutputString())
+
+    def delete_cookie(
+        self, name: str, *, path: str = "/", domain: typing.Optional[str] = None
+    ) -> None:
+        """Tells the client to remove a cookie"""
+        self.set_cookie(name, "", max_age=0, path=path, domain=domain)
+
+    @property
+    def cookies(self) -> typing.List[str]:
+        """The Set-Cookie header values of the response"""
+        return list(self._cookies or ())
+
+    def to_wsgi(self) -> typing.Tuple[str, typing.List[tuple], typing.Iterable[bytes]]:
+        """Returns the WSGI status line, headers and body of the response"""
+        status = _STATUS_LINES.get(self.status) or f"{self.status} Unknown"
+        empty = self.status in (204, 304) or self.status < 200
+        headers = []
+        if self.headers:
+            headers.extend(
+                self.headers.items() if isinstance(self.headers, dict) else self.headers
+            )
+        if (
+            self.content_type is not None
+            and not empty
+            and not any(name.lower() == "content-type" for name, _ in headers)
+        ):
+            headers.insert(0, ("Content-Type", self.content_type))
+        if self._cookies:
+            headers.extend(("Set-Cookie", cookie) for cookie in self._cookies)
+        body = self.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if isinstance(body, bytes):
+            if empty:
+                return status, headers, []
+            headers.append(("Content-Length", str(len(body))))
+            return status, headers, [body]
+        return status, headers, body
+
+
 class ImmutableDict(dict):
     """An immutable dictionary implementation for query arguments and form data"""
 
@@ -32,10 +140,46 @@ class ImmutableDict(dict):
 
 
 class Request(object):
-    """An object that contains information related to the HTTP request"""
+    """An object that contains information related to the HTTP request
+
+    The query string, body and form are parsed lazily on first access and
+    cached. Bodies are read incrementally and never past `max_body_size`.
+    """
+
+    __slots__ = (
+        "_environ",
+        "_path_params",
+        "_max_body_size",
+        "_query_args",
+        "_query_lists",
+        "_body",
+        "_body_consumed",
+        "_form",
+        "_files",
+        "_cookies",
+    )
 
-    def __init__(self, environ):
+    def __init__(
+        self,
+        environ,
+        path_params: typing.Optional[dict] = None,
+        max_body_size: typing.Optional[int] = None,
+    ):
         self._environ = environ
+        self._path_params = path_params or {}
+        self._max_body_size = max_body_size
+        self._query_args = None
+        self._query_lists = None
+        self._body = None
+        self._body_consumed = False
+        self._form = None
+        self._files = None
+        self._cookies = None
+
+    @property
+    def environ(self) -> dict:
+        """The WSGI environ the request was built from"""
+        return self._environ
 
     @property
     def method(self) -> str:
@@ -47,42 +191,215 @@ class Request(object):
         """The route/endpoint used for that specific request"""
         return self._environ["PATH_INFO"]
 
+    @property
+    def path_params(self) -> ImmutableDict:
+        """Parameters captured from the route, e.g. `id` in `/users/<int:id>`"""
+        return ImmutableDict(self._path_params)
+
+    @property
+    def headers(self) -> ImmutableDict:
+        """Request headers, keyed by their WSGI names (e.g. `HTTP_ACCEPT`)"""
+        return ImmutableDict(
+            (k, v)
+            for k, v in self._environ.items()
+            if k.startswith("HTTP_") or k in ("CONTENT_TYPE", "CONTENT_LENGTH")
+        )
+
+    @property
+    def content_length(self) -> typing.Optional[int]:
+        try:
+            return int(self._environ.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return None
+
+    def _parse_query(self) -> None:
+        lists: typing.Dict[str, typing.List[str]] = {}
+        for name, value in parse_qsl(
+            self._environ.get("QUERY_STRING", ""), keep_blank_values=True
+        ):
+            lists.setdefault(name, []).append(value)
+        self._query_lists = ImmutableDict(lists)
+        # Like before, the last value wins when a key is repeated
+        self._query_args = ImmutableDict((k, v[-1]) for k, v in lists.items())
+
     @property
     def query_args(self) -> ImmutableDict:
         """Query arguments from the request"""
-        args = self._environ["QUERY_STRING"]
-        if not args:
-            return ImmutableDict({})
-        args = args.split("&")
-        query_args = {}
-        for _arg in args:
-            name, value = _arg.split("=")
-            query_args[name] = value
+        if self._query_args is None:
+            self._parse_query()
+        return self._query_args
+
+    @property
+    def query_lists(self) -> ImmutableDict:
+        """Query arguments from the request, with every value of repeated keys"""
+        if self._query_lists is None:
+            self._parse_query()
+        return self._query_lists
+
+    def stream(self, chunk_size: int = 64 * 1024) -> typing.Iterator[bytes]:
+        """Yields the request body in chunks as it's read from the client
+
+        The body can only be consumed once, either through this or `body`.
+        """
+        if self._body is not None:
+            yield self._body
+            return
+        if self._body_consumed:
+            raise BadRequestError("The request body has already been consumed")
+        self._body_consumed = True
+        stream = self._environ.get("wsgi.input")
+        if stream is None:
+            return
+        length = self.content_length
+        if length is None and not self._environ.get("wsgi.input_terminated"):
+            # Without a length, only servers that terminate the input can be
+            # read until EOF
+            return
+        limit = self._max_body_size
+        if length is not None and limit is not None and length > limit:
+            raise RequestEntityTooLarge(f"Request body exceeds {limit} bytes")
+
+        read = 0
+        while length is None or read < length:
+            size = chunk_size if length is None else min(chunk_size, length - read)
+            chunk = stream.read(size)
+            if not chunk:
+                break
+            read += len(chunk)
+            if limit is not None and read > limit:
+                raise RequestEntityTooLarge(f"Request body exceeds {limit} bytes")
+            yield chunk
+
+    @property
+    def body(self) -> bytes:
+        """The raw request body"""
+        if self._body is None:
+            self._body = b"".join(self.stream())
+        return self._body
 
-        return ImmutableDict(query_args)
+    def _parse_form(self) -> None:
+        content_type = self._environ.get("CONTENT_TYPE", "")
+        boundary = MultipartParser.boundary_from(content_type)
+        if boundary is None:
+            fields: typing.Dict[str, str] = {}
+            for name, value in parse_qsl(
+                self.body.decode("utf-8", "replace"), keep_blank_values=True
+            ):
+                fields.setdefault(name, value)  # First value wins, like before
+            self._form = ImmutableDict(fields)
+            self._files = ImmutableDict()
+            return
+        parser = MultipartParser(boundary)
+        for chunk in self.stream():
+            parser.feed(chunk)
+        parser.close()
+        self._form = ImmutableDict(parser.fields)
+        self._files = ImmutableDict(parser.files)
 
     @property
     def form(self) -> typing.Optional[typing.Dict]:
         """Form data sent via HTTP request"""
-        data = self._environ.get("wsgi.input")  # Returns io.BytesIO object
-        if data:
-            form_dict = parse_qs(data.getvalue().decode("utf-8"))
+        if self._environ.get("wsgi.input") is None:
+            return None
+        if self._form is None:
+            self._parse_form()
+        return self._form
 
-            final_dict = {}
+    @property
+    def files(self) -> ImmutableDict:
+        """Files uploaded through a `multipart/form-data` form"""
+        if self._environ.get("wsgi.input") is None:
+            return ImmutableDict()
+        if self._files is None:
+            self._parse_form()
+        return self._files
 
-            for k, v in form_dict.items():
-                final_dict[k] = v[0]  # Since v is list containing the form data
-            return ImmutableDict(final_dict)
+    @property
+    def cookies(self) -> ImmutableDict:
+        """Cookies sent with the request"""
+        if self._cookies is None:
+            cookie = SimpleCookie()
+            try:
+                cookie.load(self._environ.get("HTTP_COOKIE", ""))
+            except Exception:
+                pass
+            self._cookies = ImmutableDict(
+                (name, morsel.value) for name, morsel in cookie.items()
+            )
+        return self._cookies
 
     def __str__(self):
         return f'<Request endpoint="{self.endpoint}" method="{self.method}">'
 
 
 class Endpoint(object):
-    def __init__(self, route, func) -> None:
+    """A route along with its handler(s)
+
+    An endpoint created without `methods` answers every HTTP method with the
+    same handler. Otherwise each method gets its own handler and requests
+    with any other method are answered with 405 Method Not Allowed.
+    """
+
+    def __init__(
+        self, route, func, methods: typing.Optional[typing.Iterable[str]] = None
+    ) -> None:
         self.route = route
         self.extension = None
+        # (before, after) request hooks, compiled by the app. None if no hooks
+        self.hooks = None
+        # Used by admission control, see `pogweb.admission`
+        self.rate_limit = None
+        self.priority = "normal"
         self._func = func
+        self._handlers: typing.Dict[str, typing.Callable] = {}
+        self._any_method = methods is None
+        if methods is not None:
+            self.add_handler(methods, func)
+
+    @property
+    def allowed_methods(self) -> typing.Optional[typing.List[str]]:
+        """Methods this endpoint answers, None if it answers all of them"""
+        if self._any_method:
+            return None
+        methods = list(self._handlers)
+        if "GET" in self._handlers and "HEAD" not in self._handlers:
+            methods.append("HEAD")
+        return methods
+
+    def add_handler(self, methods: typing.Iterable[str], func: typing.Callable):
+        """Registers a handler for specific HTTP methods on this endpoint"""
+        if self._any_method:
+            raise EndpointError(
+                f"The endpoint {self.route} already handles every method"
+            )
+        for method in methods:
+            method = method.upper()
+            if method in self._handlers:
+                raise EndpointError(
+                    f"The endpoint {self.route} already handles {method}"
+                )
+            self._handlers[method] = func
+
+    def merge(self, other: "Endpoint") -> None:
+        """Adds the handlers of another endpoint with the same route"""
+        if self._any_method or other._any_method:
+            raise EndpointError(f"The endpoint {self.route} already exists")
+        for method, func in other._handlers.items():
+            self.add_handler([method], func)
+
+    def handler_for(self, method: str) -> typing.Optional[typing.Callable]:
+        """Returns the handler for a method, None if the method isn't allowed"""
+        if self._any_method:
+            return self._func
+        handler = self._handlers.get(method)
+        if handler is None and method == "HEAD":
+            return self._handlers.get("GET")
+        return handler
 
     def __call__(self, request: Request):
-        return self._func(request)
+        handler = self.handler_for(request.method)
+        if handler is None:
+            raise EndpointError(
+                f"The endpoint {self.route} doesn't handle {request.method}"
+            )
+        return handler(request)
@@ -0,0 +1,200 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from email.message import Message
+from pogweb.errors import BadRequestError
+
+import io
+import shutil
+import tempfile
+import typing
+
+__all__: typing.Final = ["UploadedFile", "MultipartParser"]
+
+
+class UploadedFile(object):
+    """A file uploaded through a `multipart/form-data` form
+
+    Small files are kept in memory, bigger ones are spilled to a temporary
+    file on disk which is removed once the file is closed.
+    """
+
+    __slots__ = ("name", "filename", "content_type", "file", "size")
+
+    def __init__(
+        self, name: str, filename: str, content_type: str, spool_size: int
+    ) -> None:
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def save(self, path: str) -> None:
+        """Copies the file's contents to `path`"""
+        self.file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.file, f)
+        self.file.seek(0)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __repr__(self) -> str:
+        return f'<UploadedFile name="{self.name}" filename="{self.filename}" size={self.size}>'
+
+
+class _Field(object):
+    __slots__ = ("name", "data")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.data = io.BytesIO()
+
+
+class MultipartParser(object):
+    """Incremental `multipart/form-data` parser
+
+    Chunks are fed in as they're read from the request body, so only file
+    parts bigger than `spool_size` ever end up on disk and nothing has to hold
+    the whole body at once.
+    """
+
+    def __init__(
+        self,
+        boundary: str,
+        *,
+        spool_size: int = 1024 * 1024,
+        max_field_size: int = 1024 * 1024,
+        max_header_size: int = 8 * 1024,
+        encoding: str = "utf-8",
+    ) -> None:
+        self._delimiter = b"--" + boundary.encode("latin-1")
+        self._spool_size = spool_size
+        self._max_field_size = max_field_size
+        self._max_header_size = max_header_size
+        self._encoding = encoding
+        self._buffer = b""
+        self._state = "preamble"
+        self._part: typing.Union[_Field, UploadedFile, None] = None
+        self.fields: typing.Dict[str, str] = {}
+        self.files: typing.Dict[str, UploadedFile] = {}
+
+    @staticmethod
+    def boundary_from(content_type: str) -> typing.Optional[str]:
+        """Extracts the boundary from a `multipart/form-data` content type"""
+        message = Message()
+        message["content-type"] = content_type
+        if message.get_content_type() != "multipart/form-data":
+            return None
+        return message.get_param("boundary")
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        while self._step():
+            pass
+
+    def close(self) -> None:
+        if self._state != "done":
+            raise BadRequestError("Multipart body ended unexpectedly")
+
+    def _step(self) -> bool:
+        """Parses as much of the buffer as possible, returns False if stuck"""
+        delimiter = self._delimiter
+        buffer = self._buffer
+        if self._state == "preamble":
+            index = buffer.find(delimiter)
+            if index == -1:
+                self._buffer = buffer[-len(delimiter) :]
+                return False
+            self._buffer = buffer[index + len(delimiter) :]
+            self._state = "delimiter"
+            return True
+
+        if self._state == "delimiter":
+            if len(buffer) < 2:
+                return False
+            if buffer[:2] == b"--":
+                self._state = "done"
+                self._buffer = b""
+                return False
+            if buffer[:2] != b"\r\n":
+                raise BadRequestError("Malformed multipart boundary")
+            self._buffer = buffer[2:]
+            self._state = "headers"
+            return True
+
+        if self._state == "headers":
+            index = buffer.find(b"\r\n\r\n")
+            if index == -1:
+                if len(buffer) > self._max_header_size:
+                    raise BadRequestError("Multipart part headers are too large")
+                return False
+            self._start_part(buffer[:index])
+            self._buffer = buffer[index + 4 :]
+            self._state = "body"
+            return True
+
+        if self._state == "body":
+            index = buffer.find(b"\r\n" + delimiter)
+            if index == -1:
+                # Keep enough of the tail to find a boundary split across chunks
+                keep = len(delimiter) + 2
+                if len(buffer) > keep:
+                    self._write(buffer[:-keep])
+                    self._buffer = buffer[-keep:]
+                return False
+            self._write(buffer[:index])
+            self._finish_part()
+            self._buffer = buffer[index + 2 + len(delimiter) :]
+            self._state = "delimiter"
+            return True
+        return False
+
+    def _start_part(self, raw_headers: bytes) -> None:
+        message = Message()
+        for line in raw_headers.decode(self._encoding, "replace").split("\r\n"):
+            name, sep, value = line.partition(":")
+            if sep:
+                message[name.strip()] = value.strip()
+        name = message.get_param("name", header="content-disposition")
+        if name is None:
+            raise BadRequestError("Multipart part without a name")
+        filename = message.get_param("filename", header="content-disposition")
+        if filename is not None:
+            content_type = message.get("content-type", "application/octet-stream")
+            self._part = UploadedFile(name, filename, content_type, self._spool_size)
+        else:
+            self._part = _Field(name)
+
+    def _write(self, data: bytes) -> None:
+        part = self._part
+        if isinstance(part, UploadedFile):
+            part.file.write(data)
+            part.size += len(data)
+        else:
+            if part.data.tell() + len(data) > self._max_field_size:
+                raise BadRequestError(f"Form field {part.name!r} is too large")
+            part.data.write(data)
+
+    def _finish_part(self) -> None:
+        part = self._part
+        self._part = None
+        if isinstance(part, UploadedFile):
+            part.file.seek(0)
+            self.files[part.name] = part
+        else:
+            self.fields[part.name] = part.data.getvalue().decode(
+                self._encoding, "replace"
+            )
@@ -10,19 +10,80 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 """
 
 from jinja2 import Template
+from collections import OrderedDict
+
+import os
+import threading
+import typing
+
+TEMPLATE_EXTENSIONS: typing.Final = (".html", ".htm", ".jinja", ".jinja2", ".j2")
 
 
 class Renderer(object):
-    """Responsible for rendering templates with Jinja2"""
+    """Responsible for rendering templates with Jinja2
 
-    def __init__(self, work_dir: str) -> None:
+    Compiled templates are kept in a bounded LRU cache keyed by file name. When
+    `auto_reload` is enabled the file's mtime is checked on every render so
+    edits on disk are picked up, otherwise the cached template is used as is.
+    """
+
+    def __init__(
+        self, work_dir: str, *, cache_size: int = 128, auto_reload: bool = True
+    ) -> None:
         self._dir = work_dir
+        self._cache_size = cache_size
+        self._auto_reload = auto_reload
+        self._cache: "OrderedDict[str, typing.Tuple[int, Template]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Variables available to every template, e.g. `asset_url`
+        self.globals: typing.Dict[str, typing.Any] = {}
 
     def read_html_file(self, file_name: str) -> str:
         with open(self._dir + file_name) as f:
             return f.read()
 
+    def _mtime(self, file_name: str) -> int:
+        return os.stat(self._dir + file_name).st_mtime_ns
+
+    def _compile(self, file_name: str) -> Template:
+        mtime = self._mtime(file_name)
+        template = Template(self.read_html_file(file_name))
+        with self._lock:
+            self._cache[file_name] = (mtime, template)
+            self._cache.move_to_end(file_name)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return template
+
+    def get_template(self, file_name: str) -> Template:
+        """Returns the compiled template for a file, compiling it if needed"""
+        with self._lock:
+            cached = self._cache.get(file_name)
+            if cached is not None:
+                self._cache.move_to_end(file_name)
+        if cached is None:
+            return self._compile(file_name)
+        if self._auto_reload and self._mtime(file_name) != cached[0]:
+            return self._compile(file_name)
+        return cached[1]
+
+    def precompile(self) -> int:
+        """Compiles every template in the working directory, returns the count"""
+        count = 0
+        for root, _, files in os.walk(self._dir):
+            for name in files:
+                if not name.lower().endswith(TEMPLATE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                self._compile(os.path.relpath(path, self._dir).replace(os.sep, "/"))
+                count += 1
+        return count
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
     def render_html_file(self, file_name: str, kwargs: dict) -> str:
-        data = self.read_html_file(file_name)
-        template = Template(data)
-        return template.render(kwargs)
+        if self.globals:
+            kwargs = {**self.globals, **kwargs}
+        return self.get_template(file_name).render(kwargs)
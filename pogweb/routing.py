@@ -0,0 +1,164 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from pogweb.errors import EndpointError
+
+import re
+import typing
+
+__all__: typing.Final = ["Router"]
+
+_PARAM_RE: typing.Final = re.compile(
+    r"^<(?:(?P<conv>[a-z]+):)?(?P<name>[A-Za-z_]\w*)>$"
+)
+
+
+def _to_int(segment: str) -> typing.Optional[int]:
+    if segment.isascii() and segment.isdigit():
+        return int(segment)
+    return None
+
+
+def _to_float(segment: str) -> typing.Optional[float]:
+    if not segment.isascii() or not segment.replace(".", "", 1).isdigit():
+        return None
+    return float(segment)
+
+
+def _to_str(segment: str) -> typing.Optional[str]:
+    return segment or None
+
+
+# Converters are tried in this order when several of them sit at the same depth
+CONVERTERS: typing.Final = {"int": _to_int, "float": _to_float, "str": _to_str}
+
+
+class _Node(object):
+    __slots__ = ("static", "params", "catch_all", "endpoint", "names")
+
+    def __init__(self) -> None:
+        self.static: typing.Dict[str, "_Node"] = {}
+        self.params: typing.Dict[str, "_Node"] = {}
+        self.catch_all: typing.Optional["_Node"] = None
+        self.endpoint = None
+        self.names: typing.Tuple[str, ...] = ()
+
+
+class Router(object):
+    """Maps request paths to endpoints
+
+    Routes without parameters live in a plain dict, everything else is stored
+    in a trie keyed by path segment, so a lookup costs time proportional to
+    the depth of the path rather than the number of routes. Parameters are
+    declared as `<name>`, `<int:name>`, `<float:name>`, `<str:name>` or, for
+    the last segment only, `<path:name>` which matches the rest of the path.
+    """
+
+    def __init__(self) -> None:
+        self._static: typing.Dict[str, typing.Any] = {}
+        self._root = _Node()
+        self.frozen = False
+
+    @staticmethod
+    def is_dynamic(route: str) -> bool:
+        return "<" in route
+
+    def add(self, route: str, endpoint) -> None:
+        """Adds an endpoint, raises EndpointError if the route clashes"""
+        if self.frozen:
+            raise EndpointError(f"Can't add {route}, the routes are frozen")
+        if not self.is_dynamic(route):
+            if route in self._static:
+                raise EndpointError(f"The endpoint {route} already exists")
+            self._static[route] = endpoint
+            return
+
+        node = self._root
+        names = []
+        segments = route[1:].split("/")
+        for i, segment in enumerate(segments):
+            if "<" not in segment:
+                node = node.static.setdefault(segment, _Node())
+                continue
+            param = _PARAM_RE.match(segment)
+            if param is None:
+                raise EndpointError(f"Invalid route parameter {segment!r} in {route}")
+            conv, name = param.group("conv") or "str", param.group("name")
+            if name in names:
+                raise EndpointError(f"Duplicate route parameter {name!r} in {route}")
+            names.append(name)
+            if conv == "path":
+                if i != len(segments) - 1:
+                    raise EndpointError(
+                        f"<path:{name}> must be the last segment of {route}"
+                    )
+                if node.catch_all is None:
+                    node.catch_all = _Node()
+                node = node.catch_all
+            elif conv in CONVERTERS:
+                if conv not in node.params:
+                    node.params[conv] = _Node()
+                    node.params = {
+                        c: node.params[c] for c in CONVERTERS if c in node.params
+                    }
+                node = node.params[conv]
+            else:
+                raise EndpointError(f"Unknown route converter {conv!r} in {route}")
+
+        if node.endpoint is not None:
+            raise EndpointError(
+                f"The endpoint {route} conflicts with {node.endpoint.route}"
+            )
+        node.endpoint = endpoint
+        node.names = tuple(names)
+
+    def freeze(self) -> None:
+        """Stops any more routes from being added"""
+        self.frozen = True
+
+    def match(self, path: str) -> typing.Optional[typing.Tuple[typing.Any, dict]]:
+        """Returns the endpoint and path parameters for a path, if any"""
+        endpoint = self._static.get(path)
+        if endpoint is not None:
+            return endpoint, {}
+        values: typing.List[typing.Any] = []
+        node = self._match(self._root, path[1:].split("/"), 0, values)
+        if node is None:
+            return None
+        return node.endpoint, dict(zip(node.names, values))
+
+    def _match(
+        self, node: _Node, segments: typing.List[str], depth: int, values: list
+    ) -> typing.Optional[_Node]:
+        if depth == len(segments):
+            return node if node.endpoint is not None else None
+        segment = segments[depth]
+
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, depth + 1, values)
+            if found is not None:
+                return found
+
+        for conv, child in node.params.items():
+            value = CONVERTERS[conv](segment)
+            if value is None:
+                continue
+            values.append(value)
+            found = self._match(child, segments, depth + 1, values)
+            if found is not None:
+                return found
+            values.pop()
+
+        if node.catch_all is not None and segment:
+            values.append("/".join(segments[depth:]))
+            return node.catch_all
+        return None
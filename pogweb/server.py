@@ -0,0 +1,365 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from http import HTTPStatus
+from urllib.parse import unquote
+
+import asyncio
+import logging
+import socket
+import typing
+
+__all__: typing.Final = ["serve"]
+
+_logger = logging.getLogger("pogweb.server")
+
+# Biggest piece of a Content-Length body handed to the app at once
+_READ_SIZE = 64 * 1024
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(status)
+        self.status = status
+
+
+class _Body(object):
+    """A request body, read off the connection as the app asks for it"""
+
+    def __init__(
+        self,
+        reader,
+        *,
+        length: int,
+        chunked: bool,
+        max_size: typing.Optional[int],
+        timeout: float,
+    ) -> None:
+        self._reader = reader
+        self._remaining = length
+        self._chunked = chunked
+        self._max_size = max_size
+        self._timeout = timeout
+        self._received = 0
+        self.done = not chunked and not length
+
+    async def read(self) -> bytes:
+        try:
+            return await asyncio.wait_for(self._read(), self._timeout)
+        except asyncio.TimeoutError:
+            raise _BadRequest(408)
+
+    async def _read(self) -> bytes:
+        if not self._chunked:
+            data = await self._reader.read(min(self._remaining, _READ_SIZE))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", self._remaining)
+            self._remaining -= len(data)
+            self.done = not self._remaining
+            return data
+
+        size_line = await self._reader.readuntil(b"\r\n")
+        try:
+            size = int(size_line.split(b";", 1)[0], 16)
+        except ValueError:
+            raise _BadRequest(400)
+        if size == 0:
+            # Skip trailers
+            while await self._reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            self.done = True
+            return b""
+        self._received += size
+        if self._max_size is not None and self._received > self._max_size:
+            raise _BadRequest(413)
+        data = await self._reader.readexactly(size)
+        await self._reader.readexactly(2)
+        return data
+
+
+class _Connection(object):
+    """A single keep-alive HTTP/1.1 connection feeding an ASGI app"""
+
+    def __init__(
+        self,
+        app,
+        reader,
+        writer,
+        keep_alive_timeout: float,
+        max_body_size: typing.Optional[int],
+        body_timeout: float,
+    ) -> None:
+        self._app = app
+        self._reader = reader
+        self._writer = writer
+        self._keep_alive_timeout = keep_alive_timeout
+        self._max_body_size = max_body_size
+        self._body_timeout = body_timeout
+        sock = writer.get_extra_info("sockname")
+        peer = writer.get_extra_info("peername")
+        self._server = tuple(sock[:2]) if sock else None
+        self._client = tuple(peer[:2]) if peer else None
+
+    async def run(self) -> None:
+        try:
+            while await self._handle_one():
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writer.close()
+
+    async def _read_head(self) -> typing.Optional[bytes]:
+        try:
+            return await asyncio.wait_for(
+                self._reader.readuntil(b"\r\n\r\n"), self._keep_alive_timeout
+            )
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(431)
+
+    async def _handle_one(self) -> bool:
+        """Serves one request, returns whether the connection should stay open"""
+        try:
+            head = await self._read_head()
+            if head is None:
+                return False
+            lines = head[:-4].split(b"\r\n")
+            try:
+                method, target, version = lines[0].decode("latin-1").split(" ")
+            except ValueError:
+                raise _BadRequest(400)
+            if not version.startswith("HTTP/1."):
+                raise _BadRequest(505)
+            headers = []
+            for line in lines[1:]:
+                name, sep, value = line.partition(b":")
+                if not sep:
+                    raise _BadRequest(400)
+                headers.append((name.strip().lower(), value.strip()))
+        except _BadRequest as e:
+            await self._write_error(e.status)
+            return False
+
+        header_map = dict(headers)
+        connection = header_map.get(b"connection", b"").lower()
+        keep_alive = version == "HTTP/1.1" and connection != b"close"
+
+        chunked = b"chunked" in header_map.get(b"transfer-encoding", b"").lower()
+        length = 0
+        if not chunked:
+            try:
+                length = int(header_map.get(b"content-length", b"0") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await self._write_error(400)
+                return False
+            if self._max_body_size is not None and length > self._max_body_size:
+                # Refused before reading any of it
+                await self._write_error(413)
+                return False
+        body = _Body(
+            self._reader,
+            length=length,
+            chunked=chunked,
+            max_size=self._max_body_size,
+            timeout=self._body_timeout,
+        )
+        expect_continue = header_map.get(b"expect", b"").lower() == b"100-continue"
+
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": version[5:],
+            "method": method.upper(),
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "server": self._server,
+            "client": self._client,
+        }
+        return await self._run_app(scope, body, expect_continue, keep_alive)
+
+    async def _run_app(
+        self, scope: dict, body: _Body, expect_continue: bool, keep_alive: bool
+    ) -> bool:
+        writer = self._writer
+        is_head = scope["method"] == "HEAD"
+        state = {"started": False, "chunked": False, "status": None, "headers": []}
+        disconnected = asyncio.Event()
+        body_sent = False
+
+        async def receive() -> dict:
+            nonlocal body_sent, expect_continue
+            if not body_sent:
+                if body.done:
+                    body_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                if expect_continue:
+                    # Only asked for once the app actually wants the body
+                    expect_continue = False
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                data = await body.read()
+                body_sent = body.done
+                return {
+                    "type": "http.request",
+                    "body": data,
+                    "more_body": not body_sent,
+                }
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["headers"] = list(message.get("headers", []))
+                return
+            if message["type"] != "http.response.body":
+                return
+            data = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not state["started"]:
+                state["started"] = True
+                names = {k.lower() for k, _ in state["headers"]}
+                if b"content-length" not in names:
+                    if not more_body:
+                        state["headers"].append(
+                            (b"content-length", str(len(data)).encode())
+                        )
+                    elif scope["http_version"] == "1.1":
+                        state["chunked"] = True
+                        state["headers"].append((b"transfer-encoding", b"chunked"))
+                writer.write(self._head(state["status"], state["headers"], keep_alive))
+            if data and not is_head:
+                if state["chunked"]:
+                    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    writer.write(data)
+            if not more_body and state["chunked"] and not is_head:
+                writer.write(b"0\r\n\r\n")
+            try:
+                # Waiting for the buffer to drain gives streaming endpoints
+                # backpressure from slow clients
+                await writer.drain()
+            except ConnectionError:
+                disconnected.set()
+                raise
+
+        try:
+            await self._app(scope, receive, send)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return False
+        except _BadRequest as e:
+            # The body was too big, malformed or too slow to arrive
+            if not state["started"]:
+                await self._write_error(e.status)
+            return False
+        except Exception:
+            _logger.exception("Unhandled error in the ASGI application")
+            if not state["started"]:
+                await self._write_error(500)
+            return False
+        finally:
+            disconnected.set()
+        if not state["started"]:
+            await self._write_error(500)
+            return False
+        # Whatever the app left unread is still on the wire
+        return keep_alive and body.done
+
+    @staticmethod
+    def _head(status: int, headers: list, keep_alive: bool) -> bytes:
+        try:
+            phrase = HTTPStatus(status).phrase
+        except ValueError:
+            phrase = ""
+        lines = [f"HTTP/1.1 {status} {phrase}".encode("latin-1")]
+        lines.extend(k + b": " + v for k, v in headers)
+        if not keep_alive:
+            lines.append(b"connection: close")
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+
+    async def _write_error(self, status: int) -> None:
+        body = f"{status} {HTTPStatus(status).phrase}".encode("latin-1")
+        headers = [
+            (b"content-type", b"text/plain"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        self._writer.write(self._head(status, headers, False) + body)
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(
+    app,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    *,
+    keep_alive_timeout: float = 5.0,
+    sock=None,
+    shutdown: typing.Optional[asyncio.Event] = None,
+    graceful_timeout: float = 30.0,
+    max_body_size: typing.Optional[int] = None,
+    body_timeout: float = 30.0,
+) -> None:
+    """Serves an ASGI app with a minimal asyncio HTTP/1.1 server
+
+    Meant for local runs, it supports keep-alive, chunked request and
+    response bodies and nothing fancier (no TLS, no HTTP/2, no websockets).
+    Setting the `shutdown` event stops accepting connections and gives open
+    ones up to `graceful_timeout` seconds to finish.
+
+    Request bodies are streamed to the app as it reads them. Bodies over
+    `max_body_size` get a 413, and a client that stalls for `body_timeout`
+    seconds while sending one gets a 408.
+    """
+    connections: typing.Set[asyncio.Task] = set()
+
+    async def on_connection(reader, writer) -> None:
+        conn = writer.get_extra_info("socket")
+        if conn is not None and conn.family in (socket.AF_INET, socket.AF_INET6):
+            # asyncio skips this for sockets made without an explicit proto
+            # (e.g. a shared `sock`), Nagle would then delay every response
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        task = asyncio.current_task()
+        connections.add(task)
+        try:
+            await _Connection(
+                app, reader, writer, keep_alive_timeout, max_body_size, body_timeout
+            ).run()
+        finally:
+            connections.discard(task)
+
+    if sock is not None:
+        server = await asyncio.start_server(on_connection, sock=sock)
+    else:
+        server = await asyncio.start_server(on_connection, host, port)
+    if shutdown is None:
+        async with server:
+            await server.serve_forever()
+        return
+
+    await shutdown.wait()
+    server.close()
+    if connections:
+        _, pending = await asyncio.wait(set(connections), timeout=graceful_timeout)
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,497 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from collections import OrderedDict
+from pogweb.compression import Compressor
+from email.utils import formatdate, parsedate_to_datetime
+from stat import S_ISREG
+
+import hashlib
+import mimetypes
+import os
+import threading
+import typing
+
+__all__: typing.Final = ["StaticFile", "StaticFiles"]
+
+_SUFFIXES: typing.Final = {"br": ".br", "gzip": ".gz"}
+
+# Bytes charged against the cache budget for entries that only hold metadata
+_METADATA_WEIGHT: typing.Final = 256
+
+# Fingerprinted URLs change whenever the file does, so they can be cached forever
+_IMMUTABLE: typing.Final = "public, max-age=31536000, immutable"
+
+
+class StaticFile(object):
+    """A static file along with its validators
+
+    Small files keep their bytes in `data`, big ones leave it as None and are
+    streamed from disk when served. `variants` maps a content encoding to a
+    (data, path, size) tuple for the compressed versions of the file, or to
+    None when compressing didn't make it smaller.
+    """
+
+    __slots__ = (
+        "path",
+        "data",
+        "size",
+        "stat_key",
+        "etag",
+        "last_modified",
+        "mtime",
+        "content_type",
+        "variants",
+        "digest",
+    )
+
+    def __init__(
+        self, path: str, data: typing.Optional[bytes], stat: os.stat_result
+    ) -> None:
+        self.path = path
+        self.data = data
+        self.size = stat.st_size
+        self.stat_key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        self.mtime = int(stat.st_mtime)
+        if data is not None:
+            self.etag = '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+        else:
+            self.etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.variants: typing.Dict[
+            str, typing.Optional[typing.Tuple[typing.Optional[bytes], str, int]]
+        ] = {}
+        # Content hash used in fingerprinted URLs, computed when first needed
+        self.digest: typing.Optional[str] = None
+
+    @property
+    def weight(self) -> int:
+        weight = self.size if self.data is not None else _METADATA_WEIGHT
+        for variant in self.variants.values():
+            if variant is not None and variant[0] is not None:
+                weight += len(variant[0])
+        return weight
+
+
+class _FileRange(object):
+    """Iterates over a byte range of a file in chunks, closing it when done"""
+
+    def __init__(self, f, start: int, length: int, block_size: int) -> None:
+        self._file = f
+        self._remaining = length
+        self._block_size = block_size
+        f.seek(start)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        if self._remaining <= 0:
+            raise StopIteration
+        chunk = self._file.read(min(self._block_size, self._remaining))
+        if not chunk:
+            raise StopIteration
+        self._remaining -= len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class StaticFiles(object):
+    """Serves files from disk through a size-bounded in-memory cache
+
+    Entries are revalidated against the file's stat on every hit, so a change
+    on disk invalidates the cached bytes. Files bigger than `max_file_size`
+    are never held in memory, they are streamed through `wsgi.file_wrapper`
+    (or read in `block_size` chunks if the server doesn't provide one).
+
+    With a `compressor`, precompressed `.br`/`.gz` siblings of a file are
+    served when they exist, otherwise small files are compressed once and the
+    result is kept alongside the cached entry. `build_manifest` does that
+    ahead of requests, at the best compression level.
+    """
+
+    def __init__(
+        self,
+        root: str = ".",
+        *,
+        max_cache_size: int = 32 * 1024 * 1024,
+        max_file_size: int = 1024 * 1024,
+        max_age: typing.Optional[int] = None,
+        block_size: int = 64 * 1024,
+        compressor: typing.Optional[Compressor] = None,
+    ) -> None:
+        self._root = root
+        self._compressor = compressor
+        self._max_cache_size = max_cache_size
+        self._max_file_size = max_file_size
+        self._default_max_age = max_age
+        self._block_size = block_size
+        self._max_ages: typing.Dict[str, int] = {}
+        self._cache: "OrderedDict[str, StaticFile]" = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        self._compress_lock = threading.Lock()
+        # Fingerprinted URL -> (path, digest it was made from) and path -> URL,
+        # see `build_manifest`
+        self._aliases: typing.Dict[str, typing.Tuple[str, str]] = {}
+        self._fingerprints: typing.Dict[str, str] = {}
+
+    def set_max_age(self, directory: str, seconds: int) -> None:
+        """Sets the Cache-Control max-age for files under a URL directory"""
+        self._max_ages["/" + directory.strip("/") + "/"] = seconds
+
+    def cache_control(self, path: str) -> str:
+        max_age = self._default_max_age
+        matched = ""
+        for directory, seconds in self._max_ages.items():
+            if path.startswith(directory) and len(directory) > len(matched):
+                matched, max_age = directory, seconds
+        if max_age is None:
+            return "no-cache"
+        return f"public, max-age={max_age}"
+
+    def resolve(self, path: str) -> typing.Optional[str]:
+        """Maps a URL path to a file path, refusing paths that escape the root"""
+        if ".." in path.split("/"):
+            return None
+        return self._root + path
+
+    def _store(self, key: str, entry: StaticFile) -> StaticFile:
+        """Caches a freshly loaded file, returns the entry to serve
+
+        Concurrent first requests all load the file, they then share the
+        entry cached first so its compressed versions are only made once.
+        """
+        with self._lock:
+            old = self._cache.get(key)
+            if old is not None:
+                if old.stat_key == entry.stat_key:
+                    self._cache.move_to_end(key)
+                    return old
+                del self._cache[key]
+                self._cache_size -= old.weight
+            self._cache[key] = entry
+            self._cache_size += entry.weight
+            self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        while self._cache_size > self._max_cache_size:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= evicted.weight
+
+    def get(self, path: str) -> typing.Optional[StaticFile]:
+        """Returns the file for a URL path, or None if it doesn't exist"""
+        file_path = self.resolve(path)
+        if file_path is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        stat_key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry.stat_key == stat_key:
+                self._cache.move_to_end(path)
+                return entry
+        if stat.st_size <= self._max_file_size:
+            with open(file_path, "rb") as f:
+                entry = StaticFile(file_path, f.read(), stat)
+        else:
+            entry = StaticFile(file_path, None, stat)
+        if self._compressor is not None:
+            self._find_precompressed(entry)
+        return self._store(path, entry)
+
+    def build_manifest(
+        self, directories: typing.Iterable[str], *, fingerprint: bool = False
+    ) -> typing.Dict[str, dict]:
+        """Loads every file under the given URL directories ahead of requests
+
+        Returns a manifest of URL path -> size, mtime, ETag, MIME type and
+        precompressed encodings. With `fingerprint`, every file also gets a
+        content-hashed URL (e.g. `/css/style.1a2b3c4d.css`, see `url_for`)
+        which is served with a far-future, immutable Cache-Control.
+        """
+        manifest = {}
+        suffixes = tuple(_SUFFIXES.values())
+        for directory in directories:
+            base = self.resolve("/" + directory.strip("/"))
+            if base is None or not os.path.isdir(base):
+                continue
+            for root, _, files in os.walk(base):
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    if name.endswith(suffixes) and os.path.isfile(
+                        os.path.splitext(file_path)[0]
+                    ):
+                        continue  # A precompressed copy, served via its original
+                    path = file_path[len(self._root) :].replace(os.sep, "/")
+                    entry = self.get(path)
+                    if entry is None:
+                        continue
+                    if self._compressor is not None and self._compressor.compressible(
+                        entry.content_type
+                    ):
+                        for encoding in self._compressor.encodings:
+                            self._variant(path, entry, encoding, best=True)
+                    info = {
+                        "size": entry.size,
+                        "mtime": entry.mtime,
+                        "etag": entry.etag,
+                        "content_type": entry.content_type,
+                        "precompressed": sorted(
+                            e
+                            for e, v in entry.variants.items()
+                            if v is not None and v[1] != entry.path
+                        ),
+                    }
+                    if fingerprint:
+                        info["url"] = self._add_fingerprint(path, entry)
+                    manifest[path] = info
+        return manifest
+
+    def _digest(self, entry: StaticFile) -> str:
+        """The content hash of a file, entries are rebuilt when it changes"""
+        if entry.digest is None:
+            if entry.data is not None:
+                entry.digest = entry.etag[1:9]
+            else:
+                blake = hashlib.blake2b(digest_size=16)
+                with open(entry.path, "rb") as f:
+                    for block in iter(lambda: f.read(self._block_size), b""):
+                        blake.update(block)
+                entry.digest = blake.hexdigest()[:8]
+        return entry.digest
+
+    def _add_fingerprint(self, path: str, entry: StaticFile) -> str:
+        digest = self._digest(entry)
+        head, dot, ext = path.rpartition(".")
+        if not dot or "/" in ext:
+            url = f"{path}.{digest}"
+        else:
+            url = f"{head}.{digest}.{ext}"
+        old = self._fingerprints.get(path)
+        if old is not None and old != url:
+            self._aliases.pop(old, None)
+        self._aliases[url] = (path, digest)
+        self._fingerprints[path] = url
+        return url
+
+    def url_for(self, path: str) -> str:
+        """The fingerprinted URL of a file, or `path` itself if it has none
+
+        A file that changed on disk gets a new URL. Its entry is only hashed
+        again when its stat changed.
+        """
+        url = self._fingerprints.get(path)
+        if url is None:
+            return path
+        entry = self.get(path)
+        if entry is not None and self._digest(entry) != self._aliases[url][1]:
+            url = self._add_fingerprint(path, entry)
+        return url
+
+    def _find_precompressed(self, entry: StaticFile) -> None:
+        if not self._compressor.compressible(entry.content_type):
+            return
+        for encoding in self._compressor.encodings:
+            sibling = entry.path + _SUFFIXES[encoding]
+            try:
+                stat = os.stat(sibling)
+            except OSError:
+                continue
+            if stat.st_mtime_ns < entry.stat_key[0]:
+                continue  # Older than the file itself, so it's stale
+            data = None
+            if stat.st_size <= self._max_file_size:
+                with open(sibling, "rb") as f:
+                    data = f.read()
+            entry.variants[encoding] = (data, sibling, stat.st_size)
+
+    def _variant(
+        self, path: str, entry: StaticFile, encoding: str, *, best: bool = False
+    ) -> typing.Optional[typing.Tuple[typing.Optional[bytes], str, int]]:
+        """Returns the compressed version of a file, compressing it if needed
+
+        `build_manifest` compresses at the best level ahead of requests, files
+        it didn't see are compressed on their first request, only once.
+        """
+        variant = entry.variants.get(encoding)
+        if variant is not None or encoding in entry.variants:
+            return variant
+        if entry.data is None or entry.size < self._compressor.min_size:
+            return None
+        with self._compress_lock:
+            if encoding in entry.variants:
+                return entry.variants[encoding]
+            data = self._compressor.compress(entry.data, encoding, best=best)
+            # None marks files that don't get smaller, so they aren't retried
+            variant = (data, entry.path, len(data)) if len(data) < entry.size else None
+            with self._lock:
+                entry.variants[encoding] = variant
+                if variant is not None and self._cache.get(path) is entry:
+                    self._cache_size += len(data)
+                    self._evict()
+        return variant
+
+    @staticmethod
+    def not_modified(
+        environ, entry: StaticFile, etag: typing.Optional[str] = None
+    ) -> bool:
+        """Checks the request's conditional headers against a file
+
+        `etag` overrides the file's own ETag, e.g. for a compressed version.
+        """
+        etag = etag or entry.etag
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return entry.mtime <= since
+        return False
+
+    @staticmethod
+    def parse_range(
+        environ, entry: StaticFile
+    ) -> typing.Optional[typing.Tuple[int, int]]:
+        """Parses a single-range `Range` header into an inclusive (start, end)
+
+        Returns None when the whole file should be sent and (-1, -1) when the
+        range can't be satisfied.
+        """
+        header = environ.get("HTTP_RANGE")
+        if not header or not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = environ.get("HTTP_IF_RANGE")
+        if if_range and if_range not in (entry.etag, entry.last_modified):
+            return None
+        first, _, last = header[6:].strip().partition("-")
+        try:
+            if not first:
+                length = int(last)
+                if length <= 0:
+                    return -1, -1
+                start, end = max(entry.size - length, 0), entry.size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else entry.size - 1
+        except ValueError:
+            return None
+        if start >= entry.size:
+            return -1, -1
+        if start > end:
+            return None
+        return start, min(end, entry.size - 1)
+
+    def _body(
+        self,
+        environ,
+        data: typing.Optional[bytes],
+        path: str,
+        size: int,
+        start: int,
+        length: int,
+    ):
+        if data is not None:
+            if length == size:
+                return [data]
+            return [data[start : start + length]]
+        f = open(path, "rb")
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None and length == size:
+            return file_wrapper(f, self._block_size)
+        return _FileRange(f, start, length, self._block_size)
+
+    def serve(self, environ, start_fn, headers: list) -> typing.Tuple[int, typing.Any]:
+        """Writes a static file response, returns the status code and body
+
+        Nothing is written if the file is missing (or changed since its
+        fingerprinted URL was made), the body is None then.
+        """
+        path = environ["PATH_INFO"]
+        cache_control = None
+        alias = self._aliases.get(path) if self._aliases else None
+        if alias is not None:
+            path, cache_control = alias[0], _IMMUTABLE
+        entry = self.get(path)
+        if entry is None:
+            return 404, None
+        if alias is not None and self._digest(entry) != alias[1]:
+            # The file changed since its URL was made, and immutable URLs must
+            # never serve other content. Give it a fresh one for `url_for`.
+            self._add_fingerprint(path, entry)
+            return 404, None
+
+        data, file_path, size, etag = entry.data, entry.path, entry.size, entry.etag
+        encoding = None
+        compressor = self._compressor
+        if (
+            compressor is not None
+            and "HTTP_RANGE" not in environ
+            and compressor.compressible(entry.content_type)
+        ):
+            headers.append(("Vary", "Accept-Encoding"))
+            encoding = compressor.negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+            variant = self._variant(path, entry, encoding) if encoding else None
+            if variant is not None:
+                data, file_path, size = variant
+                etag = etag[:-1] + "-" + encoding + '"'
+            else:
+                encoding = None
+
+        headers.extend(
+            [
+                ("ETag", etag),
+                ("Last-Modified", entry.last_modified),
+                ("Cache-Control", cache_control or self.cache_control(path)),
+                ("Accept-Ranges", "bytes"),
+            ]
+        )
+        if self.not_modified(environ, entry, etag):
+            start_fn("304 Not Modified", headers)
+            return 304, []
+
+        byte_range = self.parse_range(environ, entry)
+        if byte_range == (-1, -1):
+            headers.append(("Content-Range", f"bytes */{entry.size}"))
+            start_fn("416 Range Not Satisfiable", headers)
+            return 416, []
+        if byte_range is None:
+            status, start, length = 200, 0, size
+        else:
+            start, end = byte_range
+            status, length = 206, end - start + 1
+            headers.append(("Content-Range", f"bytes {start}-{end}/{entry.size}"))
+
+        headers.extend(
+            [("Content-Type", entry.content_type), ("Content-Length", str(length))]
+        )
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        start_fn("200 OK" if status == 200 else "206 Partial Content", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return status, []
+        return status, self._body(environ, data, file_path, size, start, length)
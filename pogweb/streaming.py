@@ -0,0 +1,391 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from pogweb.models import Response
+
+import asyncio
+import collections
+import json
+import queue
+import threading
+import typing
+
+__all__: typing.Final = [
+    "FLUSH",
+    "StreamingResponse",
+    "ServerSentEvent",
+    "EventStream",
+    "Broadcast",
+    "Subscription",
+    "iterate_sync",
+]
+
+
+class _Flush(object):
+    def __repr__(self) -> str:
+        return "FLUSH"
+
+
+# Yield it from a streaming body to send the buffered chunks right away
+FLUSH: typing.Final = _Flush()
+
+_HEARTBEAT: typing.Final = b": ping\n\n"
+_DONE: typing.Final = object()
+
+
+class StreamingResponse(Response):
+    """A response that is sent chunk by chunk, as its body produces them
+
+    The body is an iterable or async iterable of bytes/str. By default every
+    chunk is written out as soon as it's produced. With `buffer_size`, small
+    chunks are joined until that many bytes are buffered or `FLUSH` is
+    yielded, saving writes (and compression flushes) for tiny chunks.
+    """
+
+    __slots__ = ("buffer_size",)
+
+    def __init__(
+        self,
+        body: typing.Union[typing.Iterable, typing.AsyncIterable],
+        status: int = 200,
+        headers: typing.Union[dict, typing.List[tuple], None] = None,
+        *,
+        content_type: typing.Optional[str] = "text/plain",
+        buffer_size: int = 0,
+    ) -> None:
+        super().__init__(body, status, headers, content_type=content_type)
+        self.buffer_size = buffer_size
+
+    def to_wsgi(self) -> typing.Tuple[str, typing.List[tuple], typing.Iterable]:
+        status, headers, body = super().to_wsgi()
+        if hasattr(body, "__aiter__"):
+            return status, headers, _join_async(body, self.buffer_size)
+        return status, headers, _join(body, self.buffer_size)
+
+
+def _join(chunks: typing.Iterable, buffer_size: int) -> typing.Iterator[bytes]:
+    buffer = []
+    size = 0
+    try:
+        for chunk in chunks:
+            if chunk is not FLUSH:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                buffer.append(chunk)
+                size += len(chunk)
+                if size < buffer_size:
+                    continue
+            if size:
+                yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+        if size:
+            yield b"".join(buffer)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+async def _join_async(
+    chunks: typing.AsyncIterable, buffer_size: int
+) -> typing.AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    try:
+        async for chunk in chunks:
+            if chunk is not FLUSH:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                buffer.append(chunk)
+                size += len(chunk)
+                if size < buffer_size:
+                    continue
+            if size:
+                yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+        if size:
+            yield b"".join(buffer)
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+
+def iterate_sync(chunks: typing.AsyncIterable) -> typing.Iterator:
+    """Iterates an async iterable from synchronous code (e.g. under WSGI)
+
+    Runs it on a private event loop, one step per chunk.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        if hasattr(iterator, "aclose"):
+            loop.run_until_complete(iterator.aclose())
+        loop.close()
+
+
+class ServerSentEvent(object):
+    """A single server-sent event. Non-str data is encoded as JSON"""
+
+    __slots__ = ("data", "event", "id", "retry")
+
+    def __init__(
+        self,
+        data,
+        *,
+        event: typing.Optional[str] = None,
+        id: typing.Optional[str] = None,
+        retry: typing.Optional[int] = None,
+    ) -> None:
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+
+    def encode(self) -> bytes:
+        """The event in the text/event-stream format"""
+        lines = []
+        if self.event is not None:
+            lines.append(f"event: {self.event}")
+        if self.id is not None:
+            lines.append(f"id: {self.id}")
+        if self.retry is not None:
+            lines.append(f"retry: {self.retry}")
+        data = self.data
+        if not isinstance(data, str):
+            data = json.dumps(data, separators=(",", ":"))
+        lines.extend(f"data: {line}" for line in data.split("\n"))
+        return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def _encode_event(event) -> bytes:
+    # Bytes are taken as already encoded events (see `Broadcast.publish`)
+    if isinstance(event, bytes):
+        return event
+    if not isinstance(event, ServerSentEvent):
+        event = ServerSentEvent(event)
+    return event.encode()
+
+
+class EventStream(StreamingResponse):
+    """A Server-Sent Events response
+
+    `events` is an iterable or async iterable of `ServerSentEvent` objects,
+    or of plain data (str, or anything JSON-encodable). A comment is sent
+    every `heartbeat` seconds without events, which keeps proxies from
+    closing the connection and notices clients that went away.
+
+    With a synchronous source and a heartbeat, events are produced on a
+    helper thread into a queue of `max_pending` events, so a slow client
+    blocks the producer instead of letting events pile up in memory.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        events: typing.Union[typing.Iterable, typing.AsyncIterable],
+        *,
+        heartbeat: typing.Optional[float] = 15.0,
+        headers: typing.Union[dict, typing.List[tuple], None] = None,
+        max_pending: int = 64,
+    ) -> None:
+        if hasattr(events, "__aiter__"):
+            body = _async_events(events, heartbeat)
+        elif heartbeat:
+            body = _threaded_events(events, heartbeat, max_pending)
+        else:
+            body = (_encode_event(event) for event in events)
+        extra = [("Cache-Control", "no-cache"), ("X-Accel-Buffering", "no")]
+        if headers:
+            extra.extend(headers.items() if isinstance(headers, dict) else headers)
+        super().__init__(body, headers=extra, content_type="text/event-stream")
+
+
+async def _async_events(
+    events: typing.AsyncIterable, heartbeat: typing.Optional[float]
+) -> typing.AsyncIterator[bytes]:
+    iterator = events.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            # Waiting doesn't cancel the pending event on a timeout
+            done, _ = await asyncio.wait((pending,), timeout=heartbeat)
+            if not done:
+                yield _HEARTBEAT
+                continue
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                return
+            yield _encode_event(event)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            # The source can only be closed once it stopped running
+            await asyncio.wait((pending,))
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+def _threaded_events(
+    events: typing.Iterable, heartbeat: float, max_pending: int
+) -> typing.Iterator[bytes]:
+    pending = queue.Queue(max_pending)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=heartbeat)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for event in events:
+                if not put(_encode_event(event)):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        finally:
+            if hasattr(events, "close"):
+                events.close()
+        put(_DONE)
+
+    threading.Thread(target=produce, name="pogweb-events", daemon=True).start()
+    try:
+        while True:
+            try:
+                item = pending.get(timeout=heartbeat)
+            except queue.Empty:
+                yield _HEARTBEAT
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+
+class Subscription(object):
+    """An async iterator over the events published to a `Broadcast`
+
+    Holds at most `max_pending` events, the oldest ones are dropped (and
+    counted in `dropped`) when the subscriber can't keep up.
+    """
+
+    __slots__ = ("_hub", "_pending", "_max_pending", "_waiter", "dropped")
+
+    def __init__(self, hub: "Broadcast", max_pending: int) -> None:
+        self._hub = hub
+        self._pending = collections.deque()
+        self._max_pending = max_pending
+        self._waiter = None
+        self.dropped = 0
+
+    def _put(self, payload: bytes) -> None:
+        if len(self._pending) >= self._max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(payload)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> bytes:
+        while not self._pending:
+            if self._hub is None:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._pending.popleft()
+
+    def close(self) -> None:
+        """Unsubscribes, ending the iteration once pending events are read"""
+        if self._hub is not None:
+            self._hub._subscribers.discard(self)
+            self._hub = None
+        self._wake()
+
+    async def aclose(self) -> None:
+        self.close()
+
+
+class Broadcast(object):
+    """Publishes events to every subscribed `EventStream`, for ASGI apps
+
+    Each event is encoded once and the same bytes are queued for every
+    subscriber, so an idle subscriber only costs a small queue and a
+    waiting future. `publish` must be called from the event loop's thread,
+    use `loop.call_soon_threadsafe(hub.publish, data)` from other threads.
+    """
+
+    def __init__(self, *, max_pending: int = 32) -> None:
+        self.max_pending = max_pending
+        self._subscribers = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.max_pending)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def stream(
+        self,
+        *,
+        heartbeat: typing.Optional[float] = 15.0,
+        headers: typing.Union[dict, typing.List[tuple], None] = None,
+    ) -> EventStream:
+        """A new subscriber's `EventStream`, return it from an endpoint"""
+        return EventStream(self.subscribe(), heartbeat=heartbeat, headers=headers)
+
+    def publish(
+        self,
+        data,
+        *,
+        event: typing.Optional[str] = None,
+        id: typing.Optional[str] = None,
+    ) -> int:
+        """Sends an event to every subscriber, returns how many there are"""
+        payload = ServerSentEvent(data, event=event, id=id).encode()
+        for subscription in list(self._subscribers):
+            subscription._put(payload)
+        return len(self._subscribers)
+
+    def close(self) -> None:
+        """Ends every subscriber's stream"""
+        for subscription in list(self._subscribers):
+            subscription.close()
@@ -11,17 +11,16 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 
 from datetime import datetime
 import pogweb
-import logging
 
 
-def render_banner(ip: str, port: int) -> None:
+def render_banner(ip: str, port: int, server: str = "Waitress") -> None:
     banner = f"""
 ██████╗  ██████╗  ██████╗ ██╗    ██╗███████╗██████╗            v{pogweb.__version__}
 ██╔══██╗██╔═══██╗██╔════╝ ██║    ██║██╔════╝██╔══██╗           © K.M Ahnaf Zamil {datetime.now().year} 
 ██████╔╝██║   ██║██║  ███╗██║ █╗ ██║█████╗  ██████╔╝           Thank you for using PogWeb
 ██╔═══╝ ██║   ██║██║   ██║██║███╗██║██╔══╝  ██╔══██╗           Stay pog, POGGIES!!!!
 ██║     ╚██████╔╝╚██████╔╝╚███╔███╔╝███████╗██████╔╝           
-╚═╝      ╚═════╝  ╚═════╝  ╚══╝╚══╝ ╚══════╝╚═════╝            Running with Waitress on http://{ip}:{port}/
+╚═╝      ╚═════╝  ╚═════╝  ╚══╝╚══╝ ╚══════╝╚═════╝            Running with {server} on http://{ip}:{port}/
                                                     
     """
     print(banner)
@@ -29,10 +28,38 @@ def render_banner(ip: str, port: int) -> None:
 
 def handle_not_found(environ, start_fn) -> list:
     start_fn("404 Not Found", [("Content-Type", "text/plain")])
-    return ["404 Not Found"]
+    return [b"404 Not Found"]
 
 
-def log_request(logger: logging.Logger, environ: dict, status_code: int = 200) -> None:
-    logger.debug(
-        f"{environ['REQUEST_METHOD']}: {environ['SERVER_PROTOCOL']} '{environ['PATH_INFO']}{'?' + environ['QUERY_STRING'] if environ['QUERY_STRING'] else ''}' [{status_code}]"
+def handle_method_not_allowed(environ, start_fn, allowed: list) -> list:
+    start_fn(
+        "405 Method Not Allowed",
+        [("Content-Type", "text/plain"), ("Allow", ", ".join(allowed))],
     )
+    return [b"405 Method Not Allowed"]
+
+
+def handle_bad_request(environ, start_fn) -> list:
+    start_fn("400 Bad Request", [("Content-Type", "text/plain")])
+    return [b"400 Bad Request"]
+
+
+def handle_request_too_large(environ, start_fn) -> list:
+    start_fn("413 Request Entity Too Large", [("Content-Type", "text/plain")])
+    return [b"413 Request Entity Too Large"]
+
+
+def handle_too_many_requests(environ, start_fn, retry_after: int) -> list:
+    start_fn(
+        "429 Too Many Requests",
+        [("Content-Type", "text/plain"), ("Retry-After", str(retry_after))],
+    )
+    return [b"429 Too Many Requests"]
+
+
+def handle_service_unavailable(environ, start_fn, retry_after: int) -> list:
+    start_fn(
+        "503 Service Unavailable",
+        [("Content-Type", "text/plain"), ("Retry-After", str(retry_after))],
+    )
+    return [b"503 Service Unavailable"]
@@ -0,0 +1,283 @@
+"""
+Copyright 2021 K.M Ahnaf Zamil
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+from pogweb import server
+from pogweb.errors import PogError
+
+import asyncio
+import itertools
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import typing
+
+__all__: typing.Final = ["Arbiter"]
+
+
+class Arbiter(object):
+    """Pre-fork runner that serves one app from several worker processes
+
+    The listening socket is bound once by the master and inherited by every
+    worker, and SO_REUSEPORT is set where available so a new master can bind
+    the same port while an old one drains. Signals handled by the master:
+
+    - SIGTERM/SIGINT: graceful shutdown
+    - SIGHUP: graceful restart, new workers are started before old ones stop
+    - SIGTTIN/SIGTTOU: add/remove a worker
+
+    Dead workers are respawned, and a worker that has served `max_requests`
+    requests exits gracefully so it gets replaced by a fresh one.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        workers: int = 2,
+        max_requests: int = 0,
+        graceful_timeout: float = 30.0,
+        asgi: bool = False,
+        threads: int = 4,
+    ) -> None:
+        if not hasattr(os, "fork"):
+            raise PogError("Running with multiple workers requires os.fork()")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.asgi = asgi
+        self.threads = threads
+        self._logger = logging.getLogger("pogweb.workers")
+        self._sock: typing.Optional[socket.socket] = None
+        self._children: typing.Dict[int, float] = {}
+        self._signals: typing.List[int] = []
+        self._stopping = False
+
+    def bind(self) -> socket.socket:
+        """Binds the listening socket that the workers share"""
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.set_inheritable(True)
+        return sock
+
+    def run(self) -> None:
+        """Starts the workers and supervises them until shut down"""
+        self._sock = self.bind()
+        wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(wakeup_w, False)
+        signal.set_wakeup_fd(wakeup_w)
+        for sig in (
+            signal.SIGTERM,
+            signal.SIGINT,
+            signal.SIGHUP,
+            signal.SIGTTIN,
+            signal.SIGTTOU,
+            signal.SIGCHLD,
+        ):
+            signal.signal(sig, self._on_signal)
+
+        try:
+            self._spawn_missing()
+            while not self._stopping:
+                select.select([wakeup_r], [], [], 1.0)
+                try:
+                    os.read(wakeup_r, 4096)
+                except BlockingIOError:
+                    pass
+                self._handle_signals()
+                self._reap()
+                if not self._stopping:
+                    self._spawn_missing()
+        finally:
+            self._stop_children(list(self._children))
+            signal.set_wakeup_fd(-1)
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+            self._sock.close()
+
+    def _on_signal(self, signum, frame) -> None:
+        self._signals.append(signum)
+
+    def _handle_signals(self) -> None:
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                self._logger.info("Shutting down workers")
+                self._stopping = True
+            elif signum == signal.SIGHUP:
+                self._logger.info("Restarting workers")
+                old = list(self._children)
+                for _ in range(self.workers):
+                    self._spawn()
+                self._stop_children(old)
+            elif signum == signal.SIGTTIN:
+                self.workers += 1
+            elif signum == signal.SIGTTOU and self.workers > 1:
+                self.workers -= 1
+                self._stop_children([max(self._children, key=self._children.get)])
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self._children.pop(pid, None)
+            if started is not None and not self._stopping:
+                code = os.waitstatus_to_exitcode(status)
+                self._logger.info(f"Worker {pid} exited with code {code}")
+                if code != 0 and time.monotonic() - started < 1.0:
+                    # Don't fork in a tight loop if workers crash on boot
+                    time.sleep(1.0)
+
+    def _spawn_missing(self) -> None:
+        for _ in range(self.workers - len(self._children)):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            return
+        # Child process
+        code = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            signal.set_wakeup_fd(-1)
+            self._run_worker()
+        except BaseException:
+            self._logger.exception("Worker crashed")
+            code = 1
+        finally:
+            # os._exit() skips atexit, so flush pending access log records first
+            access_log = getattr(self.app, "access_log", None)
+            if access_log is not None:
+                access_log.stop()
+            os._exit(code)
+
+    def _stop_children(self, pids: typing.List[int]) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self._children.pop(pid, None)
+        deadline = time.monotonic() + self.graceful_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+                    self._children.pop(pid, None)
+            time.sleep(0.05)
+        for pid in remaining:
+            self._logger.warning(f"Worker {pid} didn't stop in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._children.pop(pid, None)
+
+    def _run_worker(self) -> None:
+        if self.asgi:
+            asyncio.run(self._run_asgi_worker())
+        else:
+            self._run_wsgi_worker()
+
+    def _limited(self, on_limit: typing.Callable[[], None]):
+        """Returns a counter that calls `on_limit` once max_requests is hit"""
+        counter = itertools.count(1)
+
+        def count() -> None:
+            if next(counter) == self.max_requests:
+                on_limit()
+
+        return count
+
+    def _run_wsgi_worker(self) -> None:
+        from waitress import create_server, wasyncore
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+        app = self.app
+        if self.max_requests:
+            count = self._limited(stopping.set)
+
+            def app(environ, start_fn):
+                count()
+                return self.app(environ, start_fn)
+
+        wsgi_server = create_server(app, sockets=[self._sock], threads=self.threads)
+        # Waitress' own run() drops in-flight responses when it's interrupted,
+        # so the loop is driven here to let them drain before exiting
+        deadline = None
+        while True:
+            if stopping.is_set():
+                if deadline is None:
+                    deadline = time.monotonic() + self.graceful_timeout
+                    wsgi_server.accepting = False
+                    wsgi_server.del_channel()
+                busy = False
+                for channel in list(wsgi_server.active_channels.values()):
+                    if channel.requests or channel.total_outbufs_len:
+                        busy = True
+                    else:
+                        channel.handle_close()
+                if not busy or time.monotonic() > deadline:
+                    break
+            wasyncore.loop(timeout=0.5, map=wsgi_server._map, count=1)
+        wsgi_server.task_dispatcher.shutdown()
+
+    async def _run_asgi_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        shutdown = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, shutdown.set)
+        app = self.app.asgi
+        if self.max_requests:
+            count = self._limited(shutdown.set)
+
+            async def app(scope, receive, send):
+                if scope["type"] == "http":
+                    count()
+                return await self.app.asgi(scope, receive, send)
+
+        await server.serve(
+            app,
+            sock=self._sock,
+            shutdown=shutdown,
+            graceful_timeout=self.graceful_timeout,
+            max_body_size=self.app.max_body_size,
+        )
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+
+def _call(app, path, method="GET", *, body=b"", query="", headers=None):
+    """Runs one request through a WSGI app, returns (status, headers, body)"""
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "CONTENT_LENGTH": str(len(body)) if body else "",
+    }
+    for name, value in (headers or {}).items():
+        key = name.upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = value
+    response = {}
+
+    def start_fn(status, response_headers, exc_info=None):
+        response["status"] = status
+        response["headers"] = response_headers
+
+    result = app(environ, start_fn)
+    try:
+        data = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response["status"], response["headers"], data
+
+
+@pytest.fixture
+def call():
+    return _call
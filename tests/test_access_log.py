@@ -0,0 +1,71 @@
+import io
+import json
+import logging
+
+import pytest
+
+from pogweb.access_log import AccessLogger
+
+ENVIRON = {
+    "REMOTE_ADDR": "10.0.0.1",
+    "REQUEST_METHOD": "GET",
+    "PATH_INFO": "/items",
+    "QUERY_STRING": "page=2",
+    "SERVER_PROTOCOL": "HTTP/1.1",
+}
+
+
+@pytest.fixture
+def access_logger():
+    logger = logging.getLogger("pogweb.access")
+    level, handlers = logger.level, logger.handlers[:]
+    logger.setLevel(logging.INFO)
+    yield logger
+    logger.setLevel(level)
+    logger.handlers[:] = handlers
+
+
+def test_lines_are_written_to_the_stream(access_logger):
+    stream = io.StringIO()
+    log = AccessLogger(stream=stream, flush_interval=0.01)
+    log.log(ENVIRON, 200, [("Content-Length", "12")])
+    log.stop()
+    assert (
+        stream.getvalue() == "pogweb>> 10.0.0.1 - GET: HTTP/1.1 '/items?page=2' [200]\n"
+    )
+
+
+def test_json_lines(access_logger):
+    stream = io.StringIO()
+    log = AccessLogger(format="json", stream=stream, flush_interval=0.01)
+    log.log(ENVIRON, 404)
+    log.stop()
+    record = json.loads(stream.getvalue())
+    assert record["path"] == "/items" and record["query"] == "page=2"
+    assert record["status"] == 404 and record["size"] is None
+
+
+def test_disabled_logger_queues_nothing(access_logger):
+    access_logger.setLevel(logging.WARNING)
+    log = AccessLogger(stream=io.StringIO())
+    log.log(ENVIRON, 200)
+    assert log._thread is None
+
+
+def test_lines_go_through_the_loggers_handlers(access_logger):
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    access_logger.addHandler(handler)
+    log = AccessLogger(format="{method} {path} {status}", flush_interval=0.01)
+    log.log(ENVIRON, 200)
+    log.dropped = 3
+    log.log(ENVIRON, 500)
+    log.stop()
+    messages = {record.getMessage(): record.levelno for record in records}
+    assert messages == {
+        "GET /items 200": logging.INFO,
+        "GET /items 500": logging.INFO,
+        "3 access log records dropped": logging.WARNING,
+    }
+    assert all(record.name == "pogweb.access" for record in records)
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from pogweb import WebApp, StreamingResponse, EventStream
+from pogweb.admission import AdmissionControl, RateLimit, TokenBuckets
+from pogweb.asgi import build_environ
+from pogweb.models import Endpoint
+from pogweb.errors import EndpointError
+
+
+def test_burst_then_refill():
+    buckets = TokenBuckets(RateLimit(2, burst=3))
+    assert [buckets.take("a", 0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a", 0.0) == 0.5
+    assert buckets.take("a", 0.5) == 0.0
+    assert buckets.take("b", 0.5) == 0.0
+
+
+def test_least_recently_used_is_evicted():
+    buckets = TokenBuckets(RateLimit(1, burst=10), max_keys=2)
+    buckets.take("a", 0.0)
+    buckets.take("b", 0.0)
+    buckets.take("a", 1.0)  # "b" is now the least recently used
+    buckets.take("c", 1.0)
+    assert len(buckets) == 2
+    assert set(buckets._buckets) == {"a", "c"}
+
+
+def test_idle_buckets_are_dropped():
+    # Refilling completely takes burst / rate = 5 seconds
+    buckets = TokenBuckets(RateLimit(2, burst=10), max_keys=100)
+    buckets.take("a", 0.0)
+    buckets.take("b", 3.0)
+    buckets.take("c", 5.5)
+    assert set(buckets._buckets) == {"b", "c"}
+
+
+def test_evicted_key_starts_with_a_full_bucket():
+    buckets = TokenBuckets(RateLimit(1, burst=1), max_keys=1)
+    assert buckets.take("a", 0.0) == 0.0
+    assert buckets.take("a", 0.0) == 1.0
+    buckets.take("b", 0.0)  # Evicts "a"
+    assert len(buckets) == 1
+    assert buckets.take("a", 0.0) == 0.0
+
+
+def test_unknown_priorities_are_rejected():
+    app = WebApp()
+    with pytest.raises(EndpointError):
+        app.add_endpoint("/", lambda request: "", priority="urgent")
+
+
+def test_priorities_are_checked_against_admission_control():
+    app = WebApp()
+    app.set_admission_control(AdmissionControl(priorities={"batch": 0.3}))
+    app.add_endpoint("/batch", lambda request: "", priority="batch")
+
+    other = WebApp()
+    other.add_endpoint("/batch", lambda request: "", priority="low")
+    other.routes["/batch"].priority = "batch"
+    with pytest.raises(EndpointError):
+        other.set_admission_control(AdmissionControl())
+
+
+def test_rate_limited_endpoints(call):
+    app = WebApp()
+    app.add_endpoint("/", lambda request: "ok", rate_limit=RateLimit(0.5, burst=1))
+    app.set_admission_control(AdmissionControl())
+    assert call(app, "/")[0].startswith("200")
+    status, headers, _ = call(app, "/")
+    assert status.startswith("429")
+    assert dict(headers)["Retry-After"] == "2"
+    assert app.admission.shed == 1
+
+
+def test_low_priority_requests_are_shed_first():
+    admission = AdmissionControl(max_in_flight=10)
+    low, critical = Endpoint("/low", None), Endpoint("/health", None)
+    low.priority, critical.priority = "low", "critical"
+    assert all(admission.admit({}, low) is None for _ in range(6))
+    assert admission.admit({}, low) == (503, 1)
+    assert all(admission.admit({}, critical) is None for _ in range(4))
+    assert admission.admit({}, critical) == (503, 1)
+    admission.release()
+    assert admission.admit({}, critical) is None
+    assert admission.in_flight == 10
+
+
+def streaming_app() -> WebApp:
+    app = WebApp()
+
+    @app.endpoint("/stream")
+    def stream(request):
+        return StreamingResponse(iter([b"a", b"b"]))
+
+    @app.endpoint("/")
+    def index(request):
+        return "ok"
+
+    app.set_admission_control(AdmissionControl(max_in_flight=1))
+    return app
+
+
+def test_streams_count_until_closed(call):
+    app = streaming_app()
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/stream"}
+    body = app(environ, lambda *args: None)
+    assert next(iter(body)) == b"a"
+    assert call(app, "/")[0].startswith("503")
+    body.close()
+    body.close()
+    assert app.admission.in_flight == 0
+    assert call(app, "/")[0].startswith("200")
+    assert app.admission.in_flight == 0
+
+
+def test_asgi_streams_count_until_sent():
+    app = streaming_app()
+    finish = asyncio.Event()
+
+    @app.endpoint("/events")
+    def events(request):
+        async def source():
+            yield "first"
+            await finish.wait()
+
+        return EventStream(source(), heartbeat=None)
+
+    async def main():
+        scope = {"type": "http", "method": "GET", "path": "/events", "headers": []}
+        _, _, body = await app.asgi.handle(build_environ(scope))
+        assert await body.__anext__() == b"data: first\n\n"
+        scope["path"] = "/"
+        status, _, _ = await app.asgi.handle(build_environ(scope))
+        assert status.startswith("503")
+        finish.set()
+        assert [chunk async for chunk in body] == []
+        await body.aclose()
+        assert app.admission.in_flight == 0
+        status, _, _ = await app.asgi.handle(build_environ(scope))
+        assert status.startswith("200")
+
+    asyncio.run(main())
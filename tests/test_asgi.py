@@ -0,0 +1,198 @@
+import asyncio
+import gzip
+import socket
+import threading
+
+import pytest
+
+from pogweb import WebApp
+from pogweb import server
+
+
+async def asgi_call(app, path, method="GET", *, headers=(), chunks=(b"",)):
+    """Runs one request through an ASGI app, returns (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "http_version": "1.1",
+        "scheme": "http",
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+    pending = list(chunks)
+    messages = []
+
+    async def receive():
+        if pending:
+            body = pending.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(pending)}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, *body = messages
+    return (
+        start["status"],
+        {k.decode(): v.decode() for k, v in start["headers"]},
+        b"".join(m.get("body", b"") for m in body),
+    )
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def app():
+    app = WebApp(max_body_size=100)
+
+    @app.endpoint("/sync")
+    def sync_endpoint(request):
+        return {"thread": threading.current_thread().name}
+
+    @app.endpoint("/async")
+    async def async_endpoint(request):
+        await asyncio.sleep(0)
+        return {"thread": threading.current_thread().name}
+
+    @app.endpoint("/echo", methods=["POST"])
+    def echo(request):
+        return request.body
+
+    @app.endpoint("/big")
+    async def big(request):
+        return {"items": list(range(10000))}
+
+    return app
+
+
+def test_sync_endpoints_run_on_the_thread_pool(app):
+    status, _, body = run(asgi_call(app.asgi, "/sync"))
+    assert status == 200 and b"pogweb" in body
+
+
+def test_async_endpoints_run_on_the_loop(app):
+    status, _, body = run(asgi_call(app.asgi, "/async"))
+    assert status == 200 and b"MainThread" in body
+
+
+def test_big_responses_are_encoded_off_the_loop(app, monkeypatch):
+    threads = []
+    encode = app.encode_response
+
+    def spy(environ, data):
+        threads.append(threading.current_thread().name)
+        return encode(environ, data)
+
+    monkeypatch.setattr(app, "encode_response", spy)
+    status, headers, body = run(
+        asgi_call(app.asgi, "/big", headers=[("Accept-Encoding", "gzip")])
+    )
+    assert status == 200 and headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).startswith(b'{"items":[0,1,2')
+    assert threads and "MainThread" not in threads
+
+
+def test_body_in_pieces(app):
+    status, _, body = run(
+        asgi_call(app.asgi, "/echo", "POST", chunks=[b"hello ", b"world"])
+    )
+    assert (status, body) == (200, b"hello world")
+
+
+def test_body_too_large(app):
+    status, _, _ = run(asgi_call(app.asgi, "/echo", "POST", chunks=[b"x" * 60] * 2))
+    assert status == 413
+    status, _, _ = run(
+        asgi_call(app.asgi, "/echo", "POST", headers=[("Content-Length", "1000")])
+    )
+    assert status == 413
+
+
+def test_not_found_and_method_not_allowed(app):
+    assert run(asgi_call(app.asgi, "/missing"))[0] == 404
+    assert run(asgi_call(app.asgi, "/echo"))[0] == 405
+
+
+@pytest.fixture
+def address(app):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    loop = asyncio.new_event_loop()
+    shutdown = asyncio.Event()
+    thread = threading.Thread(
+        target=loop.run_until_complete,
+        args=(
+            server.serve(
+                app.asgi,
+                sock=sock,
+                shutdown=shutdown,
+                graceful_timeout=0.1,
+                max_body_size=app.max_body_size,
+                body_timeout=0.2,
+            ),
+        ),
+    )
+    thread.start()
+    yield sock.getsockname()
+    loop.call_soon_threadsafe(shutdown.set)
+    thread.join()
+    loop.close()
+
+
+def exchange(address, data: bytes) -> bytes:
+    with socket.create_connection(address, timeout=5) as conn:
+        conn.sendall(data)
+        response = b""
+        while chunk := conn.recv(65536):
+            response += chunk
+    return response
+
+
+def test_server_keep_alive(address):
+    response = exchange(
+        address,
+        b"POST /echo HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello"
+        b"GET /sync HTTP/1.1\r\nConnection: close\r\n\r\n",
+    )
+    assert response.count(b"HTTP/1.1 200 OK") == 2
+    assert b"\r\n\r\nhello" in response
+
+
+def test_server_chunked_body(address):
+    response = exchange(
+        address,
+        b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n"
+        b"\r\n5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n",
+    )
+    assert response.startswith(b"HTTP/1.1 200") and response.endswith(b"hello world")
+
+
+@pytest.mark.parametrize(
+    "request_bytes, status",
+    [
+        (b"POST /echo HTTP/1.1\r\nContent-Length: 1000\r\n\r\n", b"413"),
+        (
+            b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + b"40\r\n"
+            + b"x" * 64
+            + b"\r\n"
+            + b"40\r\n"
+            + b"x" * 64
+            + b"\r\n0\r\n\r\n",
+            b"413",
+        ),
+        # Stalls after part of the body
+        (b"POST /echo HTTP/1.1\r\nContent-Length: 10\r\n\r\nhel", b"408"),
+        (b"POST /echo HTTP/1.1\r\nContent-Length: -1\r\n\r\n", b"400"),
+        (b"GET /sync HTTP/2.0\r\n\r\n", b"505"),
+    ],
+)
+def test_server_rejects(address, request_bytes, status):
+    assert exchange(address, request_bytes).startswith(b"HTTP/1.1 " + status)
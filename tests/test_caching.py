@@ -0,0 +1,155 @@
+import asyncio
+import gzip
+import pickle
+import threading
+import time
+
+import pytest
+
+from pogweb import WebApp, cached
+from pogweb.caching import CacheBackend, CachedResponse, MemoryBackend, ResponseCache
+
+
+def response(body: bytes) -> CachedResponse:
+    return CachedResponse("200 OK", (("Content-Type", "text/html"),), body)
+
+
+def test_memory_backend_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    backend = MemoryBackend()
+    backend.set("a", response(b"a"), ttl=10)
+    assert backend.get("a").body == b"a"
+    now[0] += 11
+    assert backend.get("a") is None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_size=2 * (256 + 100))
+    backend.set("a", response(b"a" * 100), 60)
+    backend.set("b", response(b"b" * 100), 60)
+    backend.get("a")
+    backend.set("c", response(b"c" * 100), 60)
+    assert backend.get("b") is None
+    assert backend.get("a") is not None and backend.get("c") is not None
+
+
+def test_memoised_variants_are_charged():
+    backend = MemoryBackend(max_size=2 * (256 + 100) + 50)
+    for key in ("a", "b"):
+        backend.set(key, response(b"x" * 100), 60)
+    backend.get("a").variants["gzip"] = b"z" * 60
+    # "b" was the least recently used, it makes room for the variant
+    assert backend.get("b") is None
+    assert backend._size == backend.get("a").size <= backend._max_size
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_cached_responses_pickle_without_variants():
+    value = response(b"body")
+    value.variants["gzip"] = b"z"
+    copy = pickle.loads(pickle.dumps(value))
+    assert (copy.status, copy.headers, copy.body) == (
+        value.status,
+        value.headers,
+        b"body",
+    )
+    assert copy.variants == {}
+
+
+@pytest.mark.parametrize(
+    "status, headers, body",
+    [
+        ("404 Not Found", [], [b"x"]),
+        ("200 OK", [("Set-Cookie", "a=1")], [b"x"]),
+        ("200 OK", [], iter([b"x"])),
+    ],
+    ids=["error", "cookie", "stream"],
+)
+def test_uncacheable_responses(status, headers, body):
+    assert CachedResponse.wrap(status, headers, body) == (status, headers, body)
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache()
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return response(b"x")
+
+    def miss():
+        barrier.wait()
+        results.append(cache.get_or_set("key", 60, compute))
+
+    results = []
+    threads = [threading.Thread(target=miss) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [r.body for r in results] == [b"x"] * 8
+
+
+def test_concurrent_async_misses_compute_once():
+    cache = ResponseCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return response(b"x")
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.get_or_set_async("key", 60, compute) for _ in range(8))
+        )
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r.body for r in results] == [b"x"] * 8
+
+
+def test_failed_leader_lets_waiters_compute():
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set("key", 60, fail)
+    assert cache.get_or_set("key", 60, lambda: response(b"x")).body == b"x"
+
+
+def test_cached_endpoints(call):
+    app = WebApp()
+    calls = []
+
+    @app.endpoint("/items")
+    @cached(60, vary_query=["page"], vary_headers=["Accept-Language"])
+    def items(request):
+        calls.append(1)
+        return {"page": request.query_args.get("page"), "pad": "x" * 1000}
+
+    call(app, "/items", query="page=1&other=a")
+    call(app, "/items", query="page=1&other=b")
+    call(app, "/items", "HEAD", query="page=1")
+    assert len(calls) == 1
+    call(app, "/items", query="page=2")
+    call(app, "/items", query="page=1", headers={"Accept-Language": "fr"})
+    assert len(calls) == 3
+    call(app, "/items", "POST", query="page=1")
+    assert len(calls) == 4
+
+    _, headers, body = call(
+        app, "/items", query="page=1", headers={"Accept-Encoding": "gzip"}
+    )
+    assert ("Content-Encoding", "gzip") in headers
+    assert gzip.decompress(body).startswith(b'{"page":"1"')
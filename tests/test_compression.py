@@ -0,0 +1,153 @@
+import gzip
+import threading
+
+import pytest
+
+from pogweb.compression import Compressor
+from pogweb.static import StaticFiles
+
+GZIP = {"HTTP_ACCEPT_ENCODING": "gzip"}
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("identity", None),
+        ("GZIP;q=bogus, br", "br"),
+    ],
+)
+def test_negotiate(header, expected):
+    compressor = Compressor()
+    compressor.encodings = ("br", "gzip")
+    assert compressor.negotiate(header) == expected
+
+
+def apply(headers, body, environ=GZIP, memo=None):
+    headers = list(headers)
+    body = Compressor().apply(environ, headers, body, memo)
+    return dict(headers), body
+
+
+def test_compresses_allowlisted_bodies():
+    data = b"a" * 1000
+    headers, body = apply(
+        [("Content-Type", "text/html; charset=utf-8"), ("Content-Length", "1000")],
+        [data],
+    )
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert headers["Content-Length"] == str(len(body[0]))
+    assert gzip.decompress(body[0]) == data
+
+
+@pytest.mark.parametrize(
+    "headers, data",
+    [
+        ([("Content-Type", "text/html")], b"small"),
+        ([("Content-Type", "image/png")], b"a" * 1000),
+        ([("Content-Type", "text/html"), ("Content-Encoding", "br")], b"a" * 1000),
+    ],
+    ids=["small", "not-allowlisted", "already-encoded"],
+)
+def test_leaves_other_bodies_alone(headers, data):
+    result_headers, body = apply(headers, [data])
+    assert body == [data] and result_headers == dict(headers)
+
+
+def test_client_without_gzip_still_gets_vary():
+    headers, body = apply([("Content-Type", "text/html")], [b"a" * 1000], {})
+    assert body == [b"a" * 1000]
+    assert headers["Vary"] == "Accept-Encoding"
+
+
+def test_memo_is_reused():
+    memo = {}
+    _, first = apply([("Content-Type", "text/html")], [b"a" * 1000], memo=memo)
+    assert memo == {"gzip": first[0]}
+    memo["gzip"] = b"memoised"
+    _, second = apply([("Content-Type", "text/html")], [b"a" * 1000], memo=memo)
+    assert second == [b"memoised"]
+
+
+def test_streams_are_compressed_chunk_by_chunk():
+    chunks = (b"chunk %d\n" % i for i in range(100))
+    headers, body = apply([("Content-Type", "text/plain")], chunks)
+    assert headers["Content-Encoding"] == "gzip" and "Content-Length" not in headers
+    assert gzip.decompress(b"".join(body)).startswith(b"chunk 0\nchunk 1\n")
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "css").mkdir()
+    for name in ("a", "b", "c"):
+        (tmp_path / "css" / f"{name}.css").write_text(
+            f".{name} {{ color: red }}\n" * 100
+        )
+    return tmp_path
+
+
+class CountingCompressor(Compressor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = []
+
+    def compress(self, data, encoding, *, best=False):
+        self.calls.append(best)
+        return super().compress(data, encoding, best=best)
+
+
+def test_static_files_are_compressed_at_startup(assets):
+    compressor = CountingCompressor()
+    static = StaticFiles(str(assets), compressor=compressor)
+    static.build_manifest(["css"])
+    assert compressor.calls == [True] * 3 * len(compressor.encodings)
+
+    headers = []
+    status, body = static.serve(
+        {"REQUEST_METHOD": "GET", "PATH_INFO": "/css/a.css", **GZIP},
+        lambda *args: None,
+        headers,
+    )
+    assert status == 200 and ("Content-Encoding", "gzip") in headers
+    assert gzip.decompress(b"".join(body)).startswith(b".a {")
+    assert len(compressor.calls) == 3 * len(compressor.encodings)
+
+
+def test_concurrent_first_hits_compress_once(assets):
+    compressor = CountingCompressor()
+    static = StaticFiles(str(assets), compressor=compressor)
+    barrier = threading.Barrier(8)
+
+    def hit():
+        barrier.wait()
+        static.serve(
+            {"REQUEST_METHOD": "GET", "PATH_INFO": "/css/a.css", **GZIP},
+            lambda *args: None,
+            [],
+        )
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert compressor.calls == [False]
+
+
+def test_compressed_variants_stay_within_the_cache_budget(assets):
+    data = (assets / "css" / "a.css").read_bytes()
+    compressed = Compressor().compress(data, "gzip")
+    # Room for two files, but only for one of their compressed copies
+    budget = 2 * len(data) + len(compressed) + 1
+    static = StaticFiles(str(assets), compressor=Compressor(), max_cache_size=budget)
+    for name in ("a", "b", "c"):
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": f"/css/{name}.css", **GZIP}
+        static.serve(environ, lambda *args: None, [])
+        assert static._cache_size <= budget
+        assert static._cache_size == sum(e.weight for e in static._cache.values())
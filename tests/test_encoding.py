@@ -0,0 +1,102 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import uuid
+
+import pytest
+
+from pogweb import WebApp
+from pogweb.encoding import JSONEncoder, get_json_encoder, iter_json_array
+
+INSTALLED = []
+for _name in ("orjson", "ujson", "json"):
+    try:
+        get_json_encoder(_name)
+    except ImportError:
+        continue
+    INSTALLED.append(_name)
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+
+
+@pytest.fixture(params=INSTALLED)
+def encoder(request) -> JSONEncoder:
+    return get_json_encoder(request.param)
+
+
+def test_compact_utf8_bytes(encoder):
+    data = encoder.dumps({"name": "pög", "list": [1, 2]})
+    assert isinstance(data, bytes)
+    assert data == '{"name":"pög","list":[1,2]}'.encode("utf-8")
+
+
+def test_extra_types(encoder):
+    value = {
+        "point": Point(1, 2),
+        "when": datetime.date(2021, 1, 2),
+        "id": uuid.UUID(int=1),
+        "price": decimal.Decimal("1.50"),
+        "color": Color.RED,
+        "tags": ("a",),
+    }
+    assert json.loads(encoder.dumps(value)) == {
+        "point": {"x": 1, "y": 2},
+        "when": "2021-01-02",
+        "id": "00000000-0000-0000-0000-000000000001",
+        "price": "1.50",
+        "color": "red",
+        "tags": ["a"],
+    }
+
+
+def test_unknown_types_raise(encoder):
+    with pytest.raises(TypeError):
+        encoder.dumps({"x": object()})
+
+
+def test_fastest_installed_encoder_is_the_default():
+    assert get_json_encoder().name == INSTALLED[0]
+
+
+def test_custom_encoder_objects_are_used_as_is():
+    class Custom(object):
+        def dumps(self, obj) -> bytes:
+            return b"custom"
+
+    custom = Custom()
+    assert get_json_encoder(custom) is custom
+
+
+@pytest.mark.parametrize("count", [0, 1, 5, 1000])
+def test_iter_json_array(count):
+    chunks = list(iter_json_array(iter(range(count)), JSONEncoder(), batch_size=4))
+    assert json.loads(b"".join(chunks)) == list(range(count))
+    if count == 1000:
+        assert len(chunks) > 1
+
+
+def test_endpoints(call):
+    app = WebApp(json_encoder="json")
+
+    @app.endpoint("/point")
+    def point(request):
+        return Point(1, 2)
+
+    @app.endpoint("/rows")
+    def rows(request):
+        return ({"n": n} for n in range(3))
+
+    status, headers, body = call(app, "/point")
+    assert ("Content-Type", "application/json") in headers
+    assert body == b'{"x":1,"y":2}'
+    assert call(app, "/rows")[2] == b'[{"n":0},{"n":1},{"n":2}]'
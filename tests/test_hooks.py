@@ -0,0 +1,135 @@
+import gzip
+
+from pogweb import WebApp, Extension, Response, cached
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def header(headers, name):
+    return dict((k.lower(), v) for k, v in headers).get(name.lower())
+
+
+def test_before_hook_short_circuits(call):
+    app = WebApp()
+    ran = []
+
+    @app.endpoint("/")
+    def index(request):
+        ran.append(1)
+        return "index"
+
+    @app.before_request
+    def deny(request):
+        return Response("denied", 403)
+
+    status, _, body = call(app, "/")
+    assert status.startswith("403") and body == b"denied"
+    assert ran == []
+
+
+def test_after_hooks_run_in_reverse_order(call):
+    app = WebApp()
+    order = []
+
+    @app.endpoint("/")
+    def index(request):
+        return "index"
+
+    @app.after_request
+    def first(request, response):
+        order.append("first")
+
+    @app.after_request
+    def second(request, response):
+        order.append("second")
+
+    call(app, "/")
+    assert order == ["second", "first"]
+
+
+def test_extension_hooks_added_after_loading_keep_app_hooks(call):
+    app = WebApp()
+    ext = Extension()
+
+    @ext.endpoint("/admin")
+    def admin(request):
+        return "secret"
+
+    @app.before_request
+    def auth(request):
+        return Response("no", 401)
+
+    app.load_extension(ext)
+
+    @ext.after_request
+    def tag(request, response):
+        response[1].append(("X-Ext", "1"))
+
+    status, headers, body = call(app, "/admin")
+    assert status.startswith("401") and body == b"no"
+    assert header(headers, "X-Ext") == "1"
+
+
+def test_extension_hooks_only_run_for_its_routes(call):
+    app = WebApp()
+    ext = Extension()
+
+    @app.endpoint("/")
+    def index(request):
+        return "index"
+
+    @ext.endpoint("/ext")
+    def ext_index(request):
+        return "ext"
+
+    @ext.before_request
+    def deny(request):
+        return Response("no", 401)
+
+    app.load_extension(ext)
+    assert call(app, "/")[0].startswith("200")
+    assert call(app, "/ext")[0].startswith("401")
+
+
+def test_after_hooks_see_the_uncompressed_body(call):
+    app = WebApp(cors=True)
+    seen = []
+
+    @app.endpoint("/")
+    def index(request):
+        return "x" * 2000
+
+    @app.after_request
+    def rewrite(request, response):
+        status, headers, body = response
+        seen.append((header(headers, "Content-Encoding"), b"".join(body)))
+        data = b"y" * 3000
+        headers = [(k, v) for k, v in headers if k != "Content-Length"]
+        return status, headers + [("Content-Length", str(len(data)))], [data]
+
+    _, headers, body = call(app, "/", headers={**GZIP, "Origin": "https://a.com"})
+    assert seen == [(None, b"x" * 2000)]
+    assert header(headers, "Content-Encoding") == "gzip"
+    assert header(headers, "Content-Length") == str(len(body))
+    assert header(headers, "Access-Control-Allow-Origin") == "https://a.com"
+    assert gzip.decompress(body) == b"y" * 3000
+
+
+def test_after_hooks_on_cache_hits(call):
+    app = WebApp()
+    counter = iter(range(100))
+
+    @app.endpoint("/")
+    @cached(60)
+    def index(request):
+        return "x" * 2000
+
+    @app.after_request
+    def rewrite(request, response):
+        status, headers, body = response
+        body[0] = body[0] + str(next(counter)).encode()
+
+    for i in range(3):
+        _, headers, body = call(app, "/", headers=GZIP)
+        assert gzip.decompress(body) == b"x" * 2000 + str(i).encode()
+        assert header(headers, "Content-Length") == str(len(body))
@@ -0,0 +1,113 @@
+import pytest
+
+from pogweb.errors import BadRequestError
+from pogweb.multipart import MultipartParser
+
+BODY = (
+    b"preamble\r\n"
+    b"--XyZ\r\n"
+    b'Content-Disposition: form-data; name="title"\r\n'
+    b"\r\n"
+    b"Hello\r\n--Xy not a boundary\r\n"
+    b"--XyZ\r\n"
+    b'Content-Disposition: form-data; name="upload"; filename="a.txt"\r\n'
+    b"Content-Type: text/plain\r\n"
+    b"\r\n"
+    b"line one\r\nline two\r\n"
+    b"--XyZ--\r\n"
+)
+
+
+def parse(chunks, **kwargs) -> MultipartParser:
+    parser = MultipartParser("XyZ", **kwargs)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser
+
+
+def assert_parsed(parser: MultipartParser) -> None:
+    assert parser.fields == {"title": "Hello\r\n--Xy not a boundary"}
+    upload = parser.files["upload"]
+    assert upload.filename == "a.txt"
+    assert upload.content_type == "text/plain"
+    assert upload.size == 18
+    assert upload.read() == b"line one\r\nline two"
+
+
+def test_whole_body():
+    assert_parsed(parse([BODY]))
+
+
+@pytest.mark.parametrize("split", range(1, len(BODY)))
+def test_split_anywhere(split):
+    # Covers boundaries, CRLFs and headers cut in two
+    assert_parsed(parse([BODY[:split], BODY[split:]]))
+
+
+def test_byte_at_a_time():
+    assert_parsed(parse([BODY[i : i + 1] for i in range(len(BODY))]))
+
+
+def test_big_file_is_spilled_to_disk():
+    data = b"x" * 5000
+    body = (
+        b"--XyZ\r\n"
+        b'Content-Disposition: form-data; name="f"; filename="big.bin"\r\n'
+        b"\r\n" + data + b"\r\n--XyZ--"
+    )
+    parser = parse(
+        [body[i : i + 100] for i in range(0, len(body), 100)], spool_size=1024
+    )
+    upload = parser.files["f"]
+    assert upload.file._rolled
+    assert upload.read() == data
+
+
+def test_boundary_from():
+    assert MultipartParser.boundary_from('multipart/form-data; boundary="a b"') == "a b"
+    assert MultipartParser.boundary_from("application/json") is None
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        # Missing the closing boundary
+        b'--XyZ\r\nContent-Disposition: form-data; name="a"\r\n\r\nvalue',
+        # No boundary at all
+        b"just some text",
+        b"",
+    ],
+)
+def test_truncated(body):
+    with pytest.raises(BadRequestError):
+        parse([body])
+
+
+def test_garbage_after_boundary():
+    with pytest.raises(BadRequestError):
+        parse([b"--XyZjunk\r\n"])
+
+
+def test_part_without_name():
+    with pytest.raises(BadRequestError):
+        parse([b"--XyZ\r\nContent-Disposition: form-data\r\n\r\nvalue\r\n--XyZ--"])
+
+
+def test_headers_too_large():
+    with pytest.raises(BadRequestError):
+        parse([b"--XyZ\r\nX-Padding: " + b"a" * 100], max_header_size=64)
+
+
+def test_field_too_large():
+    body = b'--XyZ\r\nContent-Disposition: form-data; name="a"\r\n\r\n'
+    with pytest.raises(BadRequestError):
+        parse([body + b"a" * 100 + b"\r\n--XyZ--"], max_field_size=64)
+
+
+def test_undecodable_field_is_replaced():
+    body = (
+        b'--XyZ\r\nContent-Disposition: form-data; name="a"\r\n\r\n'
+        b"caf\xe9\r\n--XyZ--"
+    )
+    assert parse([body]).fields == {"a": "caf�"}
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from pogweb.renderer import Renderer
+
+
+@pytest.fixture
+def html(tmp_path):
+    (tmp_path / "index.html").write_text("Hello {{ name }}")
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "about.jinja").write_text("About")
+    (tmp_path / "notes.txt").write_text("not a template")
+    return tmp_path
+
+
+def edit(path, text: str) -> None:
+    path.write_text(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_templates_are_compiled_once(html):
+    renderer = Renderer(f"{html}/")
+    template = renderer.get_template("index.html")
+    assert renderer.get_template("index.html") is template
+    assert renderer.render_html_file("index.html", {"name": "pog"}) == "Hello pog"
+
+
+def test_edits_are_picked_up(html):
+    renderer = Renderer(f"{html}/")
+    renderer.render_html_file("index.html", {"name": "pog"})
+    edit(html / "index.html", "Bye {{ name }}")
+    assert renderer.render_html_file("index.html", {"name": "pog"}) == "Bye pog"
+
+
+def test_without_auto_reload_edits_are_ignored(html):
+    renderer = Renderer(f"{html}/", auto_reload=False)
+    renderer.render_html_file("index.html", {"name": "pog"})
+    edit(html / "index.html", "Bye {{ name }}")
+    assert renderer.render_html_file("index.html", {"name": "pog"}) == "Hello pog"
+    renderer.clear_cache()
+    assert renderer.render_html_file("index.html", {"name": "pog"}) == "Bye pog"
+
+
+def test_cache_is_bounded(html):
+    renderer = Renderer(f"{html}/", cache_size=1)
+    first = renderer.get_template("index.html")
+    renderer.get_template("pages/about.jinja")
+    assert renderer.get_template("index.html") is not first
+
+
+def test_precompile(html):
+    renderer = Renderer(f"{html}/")
+    assert renderer.precompile() == 2
+    assert set(renderer._cache) == {"index.html", "pages/about.jinja"}
+
+
+def test_globals(html):
+    renderer = Renderer(f"{html}/")
+    renderer.globals["name"] = "everyone"
+    assert renderer.render_html_file("index.html", {}) == "Hello everyone"
+    assert renderer.render_html_file("index.html", {"name": "you"}) == "Hello you"
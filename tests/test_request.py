@@ -0,0 +1,88 @@
+import io
+
+import pytest
+
+from pogweb import Request
+from pogweb.errors import BadRequestError, RequestEntityTooLarge
+
+
+class CountingInput(io.BytesIO):
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def make_request(body=b"", max_body_size=None, **environ):
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/",
+        "QUERY_STRING": "",
+        "CONTENT_LENGTH": str(len(body)) if body else "",
+        "wsgi.input": CountingInput(body),
+        **environ,
+    }
+    return Request(environ, None, max_body_size)
+
+
+def test_body_is_read_lazily_and_once():
+    request = make_request(b"hello")
+    assert request.environ["wsgi.input"].reads == 0
+    assert request.body == b"hello"
+    assert request.body == b"hello"
+    assert request.environ["wsgi.input"].reads == 1
+
+
+def test_streamed_body_cannot_be_read_twice():
+    request = make_request(b"hello")
+    assert b"".join(request.stream(chunk_size=2)) == b"hello"
+    with pytest.raises(BadRequestError):
+        request.body
+
+
+def test_body_size_limit():
+    with pytest.raises(RequestEntityTooLarge):
+        make_request(b"x" * 10, max_body_size=5).body
+
+
+def test_lying_content_length_is_still_capped():
+    request = make_request(b"x" * 10, max_body_size=5, CONTENT_LENGTH="")
+    request.environ["wsgi.input_terminated"] = True
+    with pytest.raises(RequestEntityTooLarge):
+        request.body
+
+
+def test_query():
+    request = make_request(QUERY_STRING="a=1&b=2&a=3")
+    assert request.query_args["b"] == "2"
+    assert request.query_lists["a"] == ["1", "3"]
+
+
+def test_urlencoded_form():
+    request = make_request(
+        b"name=pog&name=other&empty=", CONTENT_TYPE="application/x-www-form-urlencoded"
+    )
+    assert dict(request.form) == {"name": "pog", "empty": ""}
+    assert dict(request.files) == {}
+
+
+def test_multipart_form():
+    body = (
+        b"--b\r\n"
+        b'Content-Disposition: form-data; name="title"\r\n\r\nhi\r\n'
+        b"--b\r\n"
+        b'Content-Disposition: form-data; name="f"; filename="a.txt"\r\n\r\n'
+        b"file\r\n--b--\r\n"
+    )
+    request = make_request(body, CONTENT_TYPE="multipart/form-data; boundary=b")
+    assert dict(request.form) == {"title": "hi"}
+    assert request.files["f"].read() == b"file"
+
+
+def test_headers_and_cookies():
+    request = make_request(HTTP_ACCEPT="text/html", HTTP_COOKIE="a=1; b=two")
+    assert request.headers["HTTP_ACCEPT"] == "text/html"
+    assert dict(request.cookies) == {"a": "1", "b": "two"}
@@ -0,0 +1,119 @@
+from pogweb import WebApp, Response, cached
+
+
+def header_values(headers, name):
+    return [v for k, v in headers if k.lower() == name.lower()]
+
+
+def test_caller_content_type_replaces_default(call):
+    app = WebApp()
+
+    @app.endpoint("/csv")
+    def csv(request):
+        return Response("a,b", headers={"content-type": "text/csv"})
+
+    _, headers, body = call(app, "/csv")
+    assert header_values(headers, "Content-Type") == ["text/csv"]
+    assert body == b"a,b"
+
+
+def test_cookie_responses_are_never_cached(call):
+    app = WebApp()
+    hits = []
+
+    @app.endpoint("/login")
+    @cached(60)
+    def login(request):
+        hits.append(1)
+        return Response("hi", headers={"set-cookie": f"session=user{len(hits)}"})
+
+    _, first, _ = call(app, "/login")
+    _, second, _ = call(app, "/login")
+    assert header_values(first, "Set-Cookie") == ["session=user1"]
+    assert header_values(second, "Set-Cookie") == ["session=user2"]
+
+
+def test_to_wsgi():
+    status, headers, body = Response("hi", 201, {"X-A": "1"}).to_wsgi()
+    assert status == "201 Created"
+    assert headers == [
+        ("Content-Type", "text/html"),
+        ("X-A", "1"),
+        ("Content-Length", "2"),
+    ]
+    assert body == [b"hi"]
+
+
+def test_empty_statuses_have_no_body_or_content_type():
+    status, headers, body = Response("ignored", 304).to_wsgi()
+    assert status == "304 Not Modified"
+    assert header_values(headers, "Content-Type") == [] and body == []
+
+
+def test_unknown_status():
+    assert Response(status=299).to_wsgi()[0] == "299 Unknown"
+
+
+def test_iterable_bodies_are_streamed():
+    chunks = iter([b"a", b"b"])
+    _, headers, body = Response(chunks, content_type="text/plain").to_wsgi()
+    assert header_values(headers, "Content-Length") == []
+    assert b"".join(body) == b"ab"
+
+
+def test_cookies():
+    response = Response("hi")
+    response.set_cookie("session", "abc", max_age=60, httponly=True, samesite="Lax")
+    response.delete_cookie("old")
+    cookies = header_values(response.to_wsgi()[1], "Set-Cookie")
+    assert cookies == response.cookies
+    assert cookies[0].startswith("session=abc;")
+    assert "Max-Age=60" in cookies[0] and "HttpOnly" in cookies[0]
+    assert "SameSite=Lax" in cookies[0]
+    assert cookies[1].startswith("old=") and "Max-Age=0" in cookies[1]
+
+
+def cors_app(cors):
+    app = WebApp(cors=cors)
+
+    @app.endpoint("/", methods=["GET", "POST"])
+    def index(request):
+        return "index"
+
+    return app
+
+
+def test_cors_allowlist(call):
+    app = cors_app(["https://good.com"])
+    _, good, _ = call(app, "/", headers={"Origin": "https://good.com"})
+    assert header_values(good, "Access-Control-Allow-Origin") == ["https://good.com"]
+    assert header_values(good, "Access-Control-Allow-Credentials") == ["true"]
+    for headers in ({"Origin": "https://evil.com"}, {}):
+        _, bad, _ = call(app, "/", headers=headers)
+        assert header_values(bad, "Access-Control-Allow-Origin") == []
+        # Caches must keep the responses for different origins apart
+        assert header_values(bad, "Vary") == ["Origin"]
+    assert header_values(good, "Vary") == ["Origin"]
+
+
+def test_cors_any_origin(call):
+    _, headers, _ = call(cors_app(True), "/", headers={"Origin": "https://a.com"})
+    assert header_values(headers, "Access-Control-Allow-Origin") == ["https://a.com"]
+
+
+def test_cors_disabled(call):
+    _, headers, _ = call(cors_app(False), "/", headers={"Origin": "https://a.com"})
+    assert header_values(headers, "Access-Control-Allow-Origin") == []
+    assert header_values(headers, "Vary") == []
+
+
+def test_preflight(call):
+    status, headers, body = call(
+        cors_app(True),
+        "/",
+        "OPTIONS",
+        headers={"Origin": "https://a.com", "Access-Control-Request-Method": "POST"},
+    )
+    assert status.startswith("204") and body == b""
+    assert header_values(headers, "Access-Control-Allow-Methods") == ["GET, POST, HEAD"]
+    assert header_values(headers, "Access-Control-Allow-Origin") == ["https://a.com"]
@@ -0,0 +1,129 @@
+import types
+
+import pytest
+
+from pogweb import WebApp
+from pogweb.errors import EndpointError
+from pogweb.routing import Router
+
+
+def endpoint(route: str):
+    return types.SimpleNamespace(route=route)
+
+
+def router(*routes: str) -> Router:
+    r = Router()
+    for route in routes:
+        r.add(route, endpoint(route))
+    return r
+
+
+def match(r: Router, path: str):
+    found = r.match(path)
+    if found is None:
+        return None
+    return found[0].route, found[1]
+
+
+def test_static_routes():
+    r = router("/", "/about")
+    assert match(r, "/") == ("/", {})
+    assert match(r, "/about") == ("/about", {})
+    assert match(r, "/about/") is None
+    assert match(r, "/missing") is None
+
+
+def test_parameters():
+    r = router("/users/<name>", "/users/<name>/posts/<int:post>")
+    assert match(r, "/users/john.doe") == ("/users/<name>", {"name": "john.doe"})
+    assert match(r, "/users/a/posts/7") == (
+        "/users/<name>/posts/<int:post>",
+        {"name": "a", "post": 7},
+    )
+    assert match(r, "/users/a/posts/x") is None
+    assert match(r, "/users/") is None
+
+
+def test_static_segment_wins_over_parameter():
+    r = router("/users/<name>", "/users/me")
+    assert match(r, "/users/me") == ("/users/me", {})
+    assert match(r, "/users/you") == ("/users/<name>", {"name": "you"})
+
+
+def test_converters_are_tried_in_order():
+    r = router("/v/<str:s>", "/v/<float:f>", "/v/<int:i>")
+    assert match(r, "/v/3") == ("/v/<int:i>", {"i": 3})
+    assert match(r, "/v/1.5") == ("/v/<float:f>", {"f": 1.5})
+    assert match(r, "/v/abc") == ("/v/<str:s>", {"s": "abc"})
+
+
+def test_backtracks_out_of_dead_ends():
+    r = router("/a/b/c", "/a/<x>/d")
+    assert match(r, "/a/b/d") == ("/a/<x>/d", {"x": "b"})
+
+
+def test_path_catch_all():
+    r = router("/files/<path:rest>", "/files/<name>/info")
+    assert match(r, "/files/a/b/c.txt") == ("/files/<path:rest>", {"rest": "a/b/c.txt"})
+    assert match(r, "/files/a/info") == ("/files/<name>/info", {"name": "a"})
+
+
+@pytest.mark.parametrize(
+    "routes",
+    [
+        ("/about", "/about"),
+        ("/users/<name>", "/users/<other>"),
+        ("/users/<int:a>", "/users/<int:b>"),
+    ],
+)
+def test_conflicts(routes):
+    with pytest.raises(EndpointError):
+        router(*routes)
+
+
+def test_different_converters_dont_conflict():
+    router("/users/<int:id>", "/users/<name>")
+
+
+@pytest.mark.parametrize(
+    "route",
+    [
+        "/users/<bad name>",
+        "/users/<uuid:id>",
+        "/<a>/<a>",
+        "/<path:rest>/more",
+    ],
+)
+def test_invalid_routes(route):
+    with pytest.raises(EndpointError):
+        router(route)
+
+
+def test_frozen():
+    r = router("/")
+    r.freeze()
+    with pytest.raises(EndpointError):
+        r.add("/late", endpoint("/late"))
+
+
+def test_app_routes_win_over_static_files(call, tmp_path, monkeypatch):
+    (tmp_path / "users").mkdir()
+    (tmp_path / "users" / "john.doe").write_text("a file")
+    (tmp_path / "style.css").write_text("body {}")
+    monkeypatch.chdir(tmp_path)
+    app = WebApp()
+
+    @app.endpoint("/price/<float:price>")
+    def price(request):
+        return {"price": request.path_params["price"]}
+
+    @app.endpoint("/users/<name>", methods=["GET"])
+    def user(request):
+        return {"name": request.path_params["name"]}
+
+    assert call(app, "/price/1.5")[2] == b'{"price":1.5}'
+    assert call(app, "/users/john.doe")[2] == b'{"name":"john.doe"}'
+    assert call(app, "/style.css")[2] == b"body {}"
+    assert call(app, "/missing.css")[0].startswith("404")
+    assert call(app, "/missing")[0].startswith("404")
+    assert call(app, "/users/a", "POST")[0].startswith("405")
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from pogweb import WebApp
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "site.css").write_text("body { color: red }")
+    (tmp_path / "css" / "site.css.gz").write_bytes(b"precompressed")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def touch(path, text: str) -> None:
+    path.write_text(text)
+    # Make sure the stat changes even on coarse mtime filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_manifest(site):
+    app = WebApp()
+
+    @app.endpoint("/")
+    def index(request):
+        return "index"
+
+    summary = app.startup(asset_dirs=["css"])
+    assert summary["routes"] == {"/": ["*"]}
+    info = summary["assets"]["/css/site.css"]
+    assert info["size"] == len("body { color: red }")
+    assert info["content_type"] == "text/css"
+    assert info["precompressed"] == ["gzip"]
+    assert "/css/site.css.gz" not in summary["assets"]
+    assert app.asset_url("/css/site.css") == "/css/site.css"
+
+
+def test_fingerprinted_urls_are_immutable(site, call):
+    app = WebApp()
+    app.startup(asset_dirs=["css"], fingerprint=True)
+    url = app.asset_url("/css/site.css")
+    assert url != "/css/site.css" and url.endswith(".css")
+    status, headers, body = call(app, url, headers={"Accept": "text/css"})
+    assert status.startswith("200") and body == b"body { color: red }"
+    assert ("Cache-Control", "public, max-age=31536000, immutable") in headers
+
+
+def test_changed_files_get_a_new_url(site, call):
+    app = WebApp()
+    app.startup(asset_dirs=["css"], fingerprint=True)
+    old = app.asset_url("/css/site.css")
+    touch(site / "css" / "site.css", "body { color: blue }")
+
+    new = app.asset_url("/css/site.css")
+    assert new != old
+    assert call(app, old)[0].startswith("404")
+    status, _, body = call(app, new)
+    assert status.startswith("200") and body == b"body { color: blue }"
+
+
+def test_stale_url_is_never_served(site, call):
+    app = WebApp()
+    app.startup(asset_dirs=["css"], fingerprint=True)
+    old = app.asset_url("/css/site.css")
+    touch(site / "css" / "site.css", "body { color: blue }")
+    assert call(app, old)[0].startswith("404")
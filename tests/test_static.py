@@ -0,0 +1,180 @@
+import os
+
+import pytest
+
+from pogweb.static import StaticFile, StaticFiles
+
+
+@pytest.fixture
+def entry(tmp_path) -> StaticFile:
+    path = tmp_path / "file.bin"
+    path.write_bytes(bytes(range(100)))
+    return StaticFile(str(path), path.read_bytes(), os.stat(path))
+
+
+def parse(entry: StaticFile, header: str, **environ):
+    return StaticFiles.parse_range({"HTTP_RANGE": header, **environ}, entry)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=10-", (10, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-500", (0, 99)),
+        ("bytes=90-500", (90, 99)),
+        ("bytes=99-99", (99, 99)),
+        (" bytes=0-9", None),
+        ("bytes= 5-6 ", (5, 6)),
+    ],
+)
+def test_satisfiable(entry, header, expected):
+    assert parse(entry, header) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=100-200", "bytes=-0"])
+def test_unsatisfiable(entry, header):
+    assert parse(entry, header) == (-1, -1)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "",
+        "items=0-9",
+        "bytes=0-1,5-6",  # Multiple ranges are sent in full
+        "bytes=9-0",
+        "bytes=a-b",
+        "bytes=-",
+    ],
+)
+def test_ignored(entry, header):
+    assert parse(entry, header) is None
+
+
+def test_if_range(entry):
+    assert parse(entry, "bytes=0-9", HTTP_IF_RANGE=entry.etag) == (0, 9)
+    assert parse(entry, "bytes=0-9", HTTP_IF_RANGE=entry.last_modified) == (0, 9)
+    assert parse(entry, "bytes=0-9", HTTP_IF_RANGE='"stale"') is None
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "a.txt").write_text("hello")
+    (tmp_path / "dir").mkdir()
+    return StaticFiles(str(tmp_path)), tmp_path
+
+
+def serve(static: StaticFiles, path: str, **environ):
+    started = []
+    headers = []
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, **environ}
+    status, body = static.serve(environ, lambda s, h: started.append(s), headers)
+    data = None
+    if body is not None:
+        try:
+            data = b"".join(body)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+    return status, dict(headers), data
+
+
+def test_validators(files):
+    static, _ = files
+    status, headers, body = serve(static, "/a.txt")
+    assert (status, body) == (200, b"hello")
+    assert headers["ETag"].startswith('"') and headers["Last-Modified"]
+    assert headers["Cache-Control"] == "no-cache"
+    assert headers["Content-Type"] == "text/plain"
+
+
+@pytest.mark.parametrize(
+    "header",
+    ["If-None-Match", "If-None-Match-Weak", "If-None-Match-List", "If-Modified-Since"],
+)
+def test_not_modified(files, header):
+    static, _ = files
+    _, headers, _ = serve(static, "/a.txt")
+    environ = {
+        "If-None-Match": {"HTTP_IF_NONE_MATCH": headers["ETag"]},
+        "If-None-Match-Weak": {"HTTP_IF_NONE_MATCH": "W/" + headers["ETag"]},
+        "If-None-Match-List": {"HTTP_IF_NONE_MATCH": '"other", ' + headers["ETag"]},
+        "If-Modified-Since": {"HTTP_IF_MODIFIED_SINCE": headers["Last-Modified"]},
+    }[header]
+    status, _, body = serve(static, "/a.txt", **environ)
+    assert (status, body) == (304, b"")
+
+
+def test_stale_validators_get_the_file(files):
+    static, _ = files
+    status, _, body = serve(static, "/a.txt", HTTP_IF_NONE_MATCH='"stale"')
+    assert (status, body) == (200, b"hello")
+    status, _, _ = serve(
+        static, "/a.txt", HTTP_IF_MODIFIED_SINCE="Thu, 01 Jan 1970 00:00:00 GMT"
+    )
+    assert status == 200
+
+
+def test_changes_on_disk_invalidate_the_cache(files):
+    static, root = files
+    _, before, _ = serve(static, "/a.txt")
+    (root / "a.txt").write_text("hello, world")
+    stat = os.stat(root / "a.txt")
+    os.utime(root / "a.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    status, after, body = serve(static, "/a.txt")
+    assert (status, body) == (200, b"hello, world")
+    assert after["ETag"] != before["ETag"]
+
+
+def test_cached_entries_are_reused(files):
+    static, _ = files
+    assert static.get("/a.txt") is static.get("/a.txt")
+
+
+@pytest.mark.parametrize("path", ["/missing.txt", "/dir", "/../a.txt"])
+def test_missing(files, path):
+    static, _ = files
+    assert serve(static, path)[0] == 404
+
+
+@pytest.fixture(params=[1024 * 1024, 10], ids=["memory", "disk"])
+def big(tmp_path, request):
+    (tmp_path / "data.bin").write_bytes(bytes(range(100)))
+    return StaticFiles(str(tmp_path), max_file_size=request.param)
+
+
+def test_partial_content(big):
+    status, headers, body = serve(big, "/data.bin", HTTP_RANGE="bytes=10-19")
+    assert (status, body) == (206, bytes(range(10, 20)))
+    assert headers["Content-Range"] == "bytes 10-19/100"
+    assert headers["Content-Length"] == "10"
+    assert headers["Accept-Ranges"] == "bytes"
+
+
+def test_range_not_satisfiable(big):
+    status, headers, body = serve(big, "/data.bin", HTTP_RANGE="bytes=100-")
+    assert (status, body) == (416, b"")
+    assert headers["Content-Range"] == "bytes */100"
+
+
+def test_head_has_no_body(big):
+    status, headers, body = serve(big, "/data.bin", REQUEST_METHOD="HEAD")
+    assert (status, body) == (200, b"")
+    assert headers["Content-Length"] == "100"
+
+
+def test_whole_files_use_the_file_wrapper(tmp_path):
+    (tmp_path / "data.bin").write_bytes(bytes(range(100)))
+    static = StaticFiles(str(tmp_path), max_file_size=10)
+    wrapped = []
+
+    def file_wrapper(f, block_size):
+        wrapped.append(f)
+        return iter(lambda: f.read(block_size), b"")
+
+    status, _, body = serve(static, "/data.bin", **{"wsgi.file_wrapper": file_wrapper})
+    assert (status, body) == (200, bytes(range(100)))
+    assert len(wrapped) == 1
+    wrapped[0].close()
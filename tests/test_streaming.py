@@ -0,0 +1,132 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from pogweb import WebApp, StreamingResponse, EventStream, Broadcast
+from pogweb.streaming import FLUSH, ServerSentEvent, iterate_sync
+
+
+def body_of(response) -> list:
+    return list(response.to_wsgi()[2])
+
+
+def test_chunks_are_sent_as_produced():
+    assert body_of(StreamingResponse(iter(["a", b"b", "c"]))) == [b"a", b"b", b"c"]
+
+
+def test_buffering_until_size_or_flush():
+    chunks = iter([b"a", b"b", FLUSH, b"c", b"dd", b"e"])
+    assert body_of(StreamingResponse(chunks, buffer_size=3)) == [b"ab", b"cdd", b"e"]
+
+
+def test_source_is_closed():
+    closed = []
+
+    def source():
+        try:
+            yield b"a"
+            yield b"b"
+        finally:
+            closed.append(True)
+
+    body = StreamingResponse(source()).to_wsgi()[2]
+    next(body)
+    body.close()
+    assert closed == [True]
+
+
+def test_async_bodies_under_wsgi():
+    async def source():
+        for chunk in (b"a", b"b"):
+            await asyncio.sleep(0)
+            yield chunk
+
+    status, headers, body = StreamingResponse(source()).to_wsgi()
+    assert list(iterate_sync(body)) == [b"a", b"b"]
+
+
+def test_event_format():
+    event = ServerSentEvent("line 1\nline 2", event="update", id="7", retry=1000)
+    assert event.encode() == (
+        b"event: update\nid: 7\nretry: 1000\ndata: line 1\ndata: line 2\n\n"
+    )
+    assert ServerSentEvent({"a": 1}).encode() == b'data: {"a":1}\n\n'
+
+
+def test_event_stream_headers():
+    status, headers, _ = EventStream(iter([]), heartbeat=None).to_wsgi()
+    headers = dict(headers)
+    assert headers["Content-Type"] == "text/event-stream"
+    assert headers["Cache-Control"] == "no-cache"
+    assert "Content-Length" not in headers
+
+
+def test_heartbeats_while_a_sync_source_is_idle():
+    def source():
+        yield "first"
+        time.sleep(0.25)
+        yield "second"
+
+    body = body_of(EventStream(source(), heartbeat=0.1))
+    assert body[0] == b"data: first\n\n" and body[-1] == b"data: second\n\n"
+    assert b": ping\n\n" in body[1:-1]
+
+
+def test_sync_source_errors_are_raised():
+    def source():
+        yield "first"
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        body_of(EventStream(source(), heartbeat=1))
+
+
+def test_heartbeats_while_an_async_source_is_idle():
+    async def source():
+        yield "first"
+        await asyncio.sleep(0.25)
+        yield "second"
+
+    async def collect():
+        body = EventStream(source(), heartbeat=0.1).to_wsgi()[2]
+        return [chunk async for chunk in body]
+
+    body = asyncio.run(collect())
+    assert body[0] == b"data: first\n\n" and body[-1] == b"data: second\n\n"
+    assert b": ping\n\n" in body[1:-1]
+
+
+def test_broadcast():
+    async def main():
+        hub = Broadcast(max_pending=2)
+        fast, slow = hub.subscribe(), hub.subscribe()
+        assert hub.publish({"n": 1}, event="tick") == 2
+        assert await fast.__anext__() == b'event: tick\ndata: {"n":1}\n\n'
+        hub.publish(2)
+        hub.publish(3)
+        # The slow subscriber only keeps the newest events
+        assert [await slow.__anext__(), await slow.__anext__()] == [
+            b"data: 2\n\n",
+            b"data: 3\n\n",
+        ]
+        assert slow.dropped == 1
+        hub.close()
+        assert len(hub) == 0
+        assert [chunk async for chunk in fast] == [b"data: 2\n\n", b"data: 3\n\n"]
+
+    asyncio.run(main())
+
+
+def test_generator_endpoints_stream_json(call):
+    app = WebApp()
+
+    @app.endpoint("/events")
+    def events(request):
+        return EventStream(({"n": n} for n in range(2)), heartbeat=None)
+
+    status, headers, body = call(app, "/events")
+    assert status.startswith("200")
+    events = [json.loads(line[6:]) for line in body.decode().split("\n\n") if line]
+    assert events == [{"n": 0}, {"n": 1}]